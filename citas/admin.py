@@ -9,23 +9,34 @@ Created on Tue Oct 28 21:31:45 2025
 # salon/citas/admin.py
 from django.contrib import admin
 from django import forms
+from django.db.models import Q
 from django.urls import path, reverse
 from django.shortcuts import render
 from datetime import datetime as dt
+from django.utils import timezone
 from django.utils.html import format_html
 from django.utils.crypto import get_random_string
 
+from .availability import format_minutes, to_minutes
+from .hours import business_hours
 from .models import (
+    appointment_end_time,
+    BusinessHours,
+    Resource,
     ServiceCategory,
     Service,
     Appointment,
     BlockedSlot,
+    BlockRule,
+    BlockRuleException,
     Testimonial,
     BeforeAfter,
     HomeBackground,
     VipCode,
     Package,
+    Job,
 )
+from .resources import peak_load
 
 # ====== Branding del Admin ======
 admin.site.site_header = "Nadira Fashion Salon"
@@ -35,9 +46,11 @@ admin.site.index_title = "Panel de gestión"
 
 # ====== Helpers horas ======
 def _hour_choices():
-    hours = range(8, 21)  # 08..20
+    # Mismas horas que ofrece la web (según el horario de atención y
+    # APPOINTMENT_SLOT_MINUTES). Se pasa como callable a los ChoiceField para
+    # que cada formulario tome el horario vigente.
     choices = [("", "— (sin hora) —")]
-    choices += [(f"{h:02}:00", f"{h:02}:00") for h in hours]
+    choices += [(format_minutes(m), format_minutes(m)) for m in business_hours.get().all_times()]
     return choices
 
 
@@ -67,10 +80,66 @@ class ServiceAdmin(admin.ModelAdmin):
         css = {"all": ("admin/custom.css",)}  # tema rosado
 
 
+# ====== ESTILISTAS / SILLAS ======
+@admin.register(Resource)
+class ResourceAdmin(admin.ModelAdmin):
+    list_display = ("name", "kind", "capacity", "active")
+    list_editable = ("capacity", "active")
+    list_filter = ("kind", "active")
+    search_fields = ("name",)
+    filter_horizontal = ("services",)
+
+    class Media:
+        css = {"all": ("admin/custom.css",)}
+
+
 # ====== APPOINTMENTS + TOGGLE CALENDARIO ======
+class AppointmentAdminForm(forms.ModelForm):
+    class Meta:
+        model = Appointment
+        fields = "__all__"
+
+    def clean(self):
+        cleaned = super().clean()
+        day = cleaned.get("date")
+        start = cleaned.get("time")
+        if not day or not start:
+            return cleaned
+
+        service = cleaned.get("service")
+        resource = cleaned.get("resource")
+        minutes = cleaned.get("duration_minutes") or (service.duration_minutes if service else 60)
+        end = appointment_end_time(start, minutes)
+
+        if resource and service:
+            eligible = set(resource.services.values_list("pk", flat=True))
+            if eligible and service.pk not in eligible:
+                raise forms.ValidationError(f"{resource} no hace el servicio {service}.")
+
+        # Consulta indexada (date, time, end_time)
+        overlapping = Appointment.objects.overlapping(day, start, end).exclude(pk=self.instance.pk)
+        if resource is None:
+            # Sin recurso la cita ocupa todo el salón
+            clash = overlapping.exists()
+        else:
+            rows = list(
+                overlapping.filter(Q(resource=resource) | Q(resource__isnull=True))
+                .values_list("resource_id", "time", "end_time")
+            )
+            # Citas sin recurso ocupan a todos; las del recurso, hasta su capacidad
+            clash = any(rid is None for rid, _, _ in rows) or peak_load(
+                [(to_minutes(t), to_minutes(et)) for _, t, et in rows]
+                + [(to_minutes(start), to_minutes(end))]
+            ) > resource.capacity
+        if clash:
+            raise forms.ValidationError("Ese horario se solapa con otra cita. Elegí otra hora.")
+        return cleaned
+
+
 class AppointmentAdmin(admin.ModelAdmin):
-    list_display = ("customer_name", "service", "date", "time", "customer_phone")
-    list_filter = ("service", "date")
+    form = AppointmentAdminForm
+    list_display = ("customer_name", "service", "resource", "date", "time", "end_time", "customer_phone")
+    list_filter = ("service", "resource", "date")
     search_fields = ("customer_name", "customer_phone")
     ordering = ("-date", "time")
     autocomplete_fields = ("service",)
@@ -102,12 +171,50 @@ class AppointmentAdmin(admin.ModelAdmin):
 admin.site.register(Appointment, AppointmentAdmin)
 
 
+# ====== HORARIO DE ATENCIÓN ======
+class BusinessHoursAdminForm(forms.ModelForm):
+    class Meta:
+        model = BusinessHours
+        fields = ["weekday", "open_time", "close_time"]
+
+    def clean(self):
+        cleaned = super().clean()
+        weekday = cleaned.get("weekday")
+        open_time = cleaned.get("open_time")
+        close_time = cleaned.get("close_time")
+        if weekday is None or not open_time or not close_time:
+            return cleaned
+        if open_time >= close_time:
+            raise forms.ValidationError("La hora de cierre debe ser mayor que la de apertura.")
+        # Los turnos de un mismo día no pueden pisarse
+        if (
+            BusinessHours.objects.filter(
+                weekday=weekday, open_time__lt=close_time, close_time__gt=open_time
+            )
+            .exclude(pk=self.instance.pk)
+            .exists()
+        ):
+            raise forms.ValidationError("Ese turno se solapa con otro del mismo día.")
+        return cleaned
+
+
+@admin.register(BusinessHours)
+class BusinessHoursAdmin(admin.ModelAdmin):
+    form = BusinessHoursAdminForm
+    list_display = ("weekday", "open_time", "close_time")
+    list_filter = ("weekday",)
+    ordering = ("weekday", "open_time")
+
+    class Media:
+        css = {"all": ("admin/custom.css",)}
+
+
 # ====== BLOCKED SLOTS (Auto bloqueos) con dropdowns ======
 class BlockedSlotAdminForm(forms.ModelForm):
-    start_time = forms.ChoiceField(choices=_hour_choices(), required=False, label="Inicio")
-    end_time = forms.ChoiceField(choices=_hour_choices(), required=False, label="Fin")
+    start_time = forms.ChoiceField(choices=_hour_choices, required=False, label="Inicio")
+    end_time = forms.ChoiceField(choices=_hour_choices, required=False, label="Fin")
     time = forms.ChoiceField(
-        choices=_hour_choices(),
+        choices=_hour_choices,
         required=False,
         label="Hora puntual (1h)",
     )
@@ -159,6 +266,89 @@ class BlockedSlotAdmin(admin.ModelAdmin):
         css = {"all": ("admin/custom.css",)}
 
 
+# ====== BLOQUEOS RECURRENTES (semanales / vacaciones) ======
+class BlockRuleAdminForm(forms.ModelForm):
+    weekdays = forms.TypedMultipleChoiceField(
+        choices=BlockRule.WEEKDAYS,
+        coerce=int,
+        widget=forms.CheckboxSelectMultiple,
+        label="Días de la semana",
+    )
+    start_time = forms.ChoiceField(choices=_hour_choices, required=False, label="Inicio")
+    end_time = forms.ChoiceField(choices=_hour_choices, required=False, label="Fin")
+
+    class Meta:
+        model = BlockRule
+        fields = ["reason", "weekdays", "start_time", "end_time", "valid_from", "valid_until", "active"]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Máscara de bits -> casillas marcadas
+        mask = self.instance.weekdays if self.instance.pk else BlockRule._meta.get_field("weekdays").default
+        self.initial["weekdays"] = [wd for wd, _ in BlockRule.WEEKDAYS if mask & (1 << wd)]
+        for name in ("start_time", "end_time"):
+            value = getattr(self.instance, name)
+            if value:
+                self.initial[name] = value.strftime("%H:%M")
+
+    def clean_weekdays(self):
+        days = self.cleaned_data["weekdays"]
+        if not days:
+            raise forms.ValidationError("Elegí al menos un día.")
+        mask = 0
+        for wd in days:
+            mask |= 1 << wd
+        return mask
+
+    def clean(self):
+        cleaned = super().clean()
+        s_time = _to_time(cleaned.get("start_time"))
+        e_time = _to_time(cleaned.get("end_time"))
+
+        if bool(s_time) != bool(e_time):
+            raise forms.ValidationError(
+                "Para bloquear un rango, seleccioná hora de inicio y fin (o ninguna para el día completo)."
+            )
+        if s_time and e_time and s_time >= e_time:
+            raise forms.ValidationError("La hora de fin debe ser mayor que la hora de inicio.")
+
+        valid_from = cleaned.get("valid_from")
+        valid_until = cleaned.get("valid_until")
+        if valid_from and valid_until and valid_until < valid_from:
+            raise forms.ValidationError("La fecha 'Hasta' debe ser posterior a 'Desde'.")
+
+        cleaned["start_time"] = s_time
+        cleaned["end_time"] = e_time
+        return cleaned
+
+
+class BlockRuleExceptionInline(admin.TabularInline):
+    model = BlockRuleException
+    extra = 1
+
+
+@admin.register(BlockRule)
+class BlockRuleAdmin(admin.ModelAdmin):
+    form = BlockRuleAdminForm
+    list_display = ("reason", "weekday_names", "start_time", "end_time", "valid_from", "valid_until", "active")
+    list_filter = ("active",)
+    search_fields = ("reason",)
+    ordering = ("-valid_from",)
+    inlines = [BlockRuleExceptionInline]
+    fieldsets = (
+        (None, {"fields": ("reason", "weekdays", "active")}),
+        ("Horario (vacío = día completo)", {"fields": ("start_time", "end_time")}),
+        ("Vigencia", {"fields": ("valid_from", "valid_until")}),
+    )
+
+    @admin.display(description="Días")
+    def weekday_names(self, obj):
+        return obj.weekday_names()
+
+    class Media:
+        css = {"all": ("admin/custom.css",)}
+
+
 # ====== TESTIMONIOS + FOTOS BEFORE/AFTER ======
 class BeforeAfterInline(admin.TabularInline):
     model = BeforeAfter
@@ -239,3 +429,24 @@ class PackageAdmin(admin.ModelAdmin):
             "description": "Marcá 'Solo VIP' para mostrar el paquete únicamente a clientas con código VIP válido.",
         }),
     )
+
+
+# ====== TRABAJOS EN SEGUNDO PLANO (citas/jobs.py) ======
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "task", "status", "attempts", "run_after", "finished_at")
+    list_filter = ("status", "task")
+    search_fields = ("key",)
+    ordering = ("-id",)
+    readonly_fields = [f.name for f in Job._meta.fields]
+    actions = ["retry"]
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description="Reintentar")
+    def retry(self, request, queryset):
+        updated = queryset.exclude(status=Job.RUNNING).update(
+            status=Job.PENDING, attempts=0, run_after=timezone.now(), locked_at=None
+        )
+        self.message_user(request, f"Trabajos reencolados: {updated}")
@@ -6,3 +6,9 @@ class CitasConfig(AppConfig):
     name = "citas"
     label = "citas"                 # app_label usado por el admin
     verbose_name = "Agenda"         # ← nombre en el sidebar del admin
+
+    def ready(self):
+        # Invalidación de cachés al guardar/borrar modelos
+        from . import signals  # noqa: F401
+        # Registro de las tareas del worker (citas/jobs.py)
+        from . import tasks  # noqa: F401
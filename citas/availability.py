@@ -0,0 +1,423 @@
+# salon/citas/availability.py
+"""
+Motor único de disponibilidad.
+
+Carga las citas y bloqueos de un día (o de un rango de días) con una consulta
+por tabla y los convierte en un mapa de ocupación con resolución de minuto.
+Con sumas prefijas, "¿cabe [inicio, fin)?" se responde en O(1) y la lista de
+horas libres para una duración D en O(horas del día), sin recorrer citas ni
+bloqueos por cada hora.
+
+Lo usan las vistas (/api/available-times/, reservas), AppointmentForm.clean
+y utils.get_available_slots.
+
+Las horas de inicio posibles salen del horario de atención (citas/hours.py):
+plantillas por día de la semana compiladas una vez, con turnos partidos.
+
+Con estilistas / sillas cargados (citas/resources.py), las citas con recurso
+se guardan como intervalos por recurso y una hora está libre si al menos un
+recurso que hace el servicio tiene un hueco para ella. Bloqueos y citas sin
+recurso ocupan todo el salón, como antes; también las citas de un recurso
+que ya no está activo (o todas, si no queda ninguno), para que su hora no
+se vuelva a ofrecer.
+
+La ocupación de cada día se guarda en la caché de Django (clave por fecha,
+vale para cualquier duración de servicio). Las señales de citas/signals.py
+invalidan solo las fechas afectadas, después del commit.
+"""
+from datetime import time as dtime, timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .hours import business_hours, slot_template
+from .models import Appointment, BlockedSlot
+from .resources import FreeGaps, merge_ranges, resources, saturated
+from .rules import FULL_DAY, block_rules
+
+MINUTES_PER_DAY = 24 * 60
+POINT_BLOCK_MINUTES = 60  # un bloqueo puntual ocupa 1h
+
+# Tipos de ocupación por minuto (el último marcado gana)
+FREE = 0
+BOOKED = 1          # cita existente (o ningún recurso libre)
+BLOCKED_RANGE = 2   # bloqueo por rango
+BLOCKED_POINT = 3   # bloqueo puntual (1h)
+CLOSED = 4          # día bloqueado completo
+
+# Tabla para bytes.translate: cualquier tipo de ocupación -> 1
+_BUSY_TABLE = bytes([0] + [1] * 255)
+# Tabla para bytes.translate: FREE -> BOOKED, el resto igual
+_BOOK_FREE_TABLE = bytes([BOOKED] + list(range(1, 256)))
+
+# 'HH:MM' precalculado para cada minuto del día (evita strftime por hora)
+_LABELS = tuple(f"{m // 60:02}:{m % 60:02}" for m in range(MINUTES_PER_DAY))
+
+
+def to_minutes(t):
+    """time -> minutos desde las 00:00."""
+    return t.hour * 60 + t.minute
+
+
+def to_time(minutes):
+    """minutos desde las 00:00 -> time."""
+    return dtime(minutes // 60, minutes % 60)
+
+
+def format_minutes(minutes):
+    """minutos desde las 00:00 -> 'HH:MM'."""
+    return _LABELS[minutes]
+
+
+class DaySchedule:
+    """
+    Ocupación de un día. Cada minuto guarda su tipo (FREE, BOOKED, ...) de lo
+    que afecta a todo el salón; las citas con recurso van aparte, como
+    intervalos por recurso. Las consultas usan una suma prefija y los huecos
+    de cada recurso, que se recalculan solo si hubo cambios.
+
+    Qué recursos están activos no se guarda acá (el día cacheado no se
+    invalida al cambiar un recurso): las citas de recursos inactivos se
+    suman a la ocupación del salón al consultar, una vez por versión de los
+    recursos.
+    """
+    __slots__ = ("date", "closed", "_occ", "_prefix", "_bookings", "_gaps", "_effective", "_effective_for")
+
+    def __init__(self, day, closed=False, occupancy=None, bookings=None):
+        self.date = day
+        self.closed = closed
+        self._occ = bytearray(occupancy) if occupancy is not None else bytearray(MINUTES_PER_DAY)
+        self._prefix = None
+        self._bookings = bookings if bookings is not None else {}
+        self._gaps = {}
+        self._effective = None
+        self._effective_for = None
+
+    def __reduce__(self):
+        # Solo se serializa lo mínimo (para caché); suma prefija y huecos se rehacen.
+        return (DaySchedule, (self.date, self.closed, bytes(self._occ), self._bookings))
+
+    def mark(self, start, end, kind):
+        """Marca [start, end) (minutos) con el tipo indicado."""
+        start = max(start, 0)
+        end = min(end, MINUTES_PER_DAY)
+        if end <= start:
+            return
+        self._occ[start:end] = bytes((kind,)) * (end - start)
+        self._effective_for = None
+
+    def book(self, resource_id, start, end):
+        """Agrega la cita [start, end) al recurso."""
+        self._bookings.setdefault(resource_id, []).append((start, end))
+        self._gaps.pop(resource_id, None)
+        self._effective_for = None
+
+    def _occupancy(self, resource_set):
+        """
+        Ocupación del salón por minuto: la marcada más las citas de recursos
+        que no están en `resource_set`, como BOOKED.
+        """
+        if self._effective_for is not resource_set:
+            active = {res.id for res in resource_set.resources}
+            occ = self._occ
+            orphans = [iv for rid, ivs in self._bookings.items() if rid not in active for iv in ivs]
+            if orphans:
+                occ = bytearray(occ)
+                for start, end in orphans:
+                    occ[start:end] = occ[start:end].translate(_BOOK_FREE_TABLE)
+            self._effective, self._effective_for = occ, resource_set
+            self._prefix = None
+        return self._effective
+
+    def _free_gaps(self, res):
+        cached = self._gaps.get(res.id)
+        if cached is None or cached[0] != res.capacity:
+            busy = saturated(self._bookings.get(res.id, ()), res.capacity)
+            cached = self._gaps[res.id] = (res.capacity, FreeGaps(busy))
+        return cached[1]
+
+    def free_resource(self, start, end, service_id=None):
+        """
+        Id del primer recurso que hace el servicio y está libre en
+        [start, end); None si no hay ninguno (o no hay recursos cargados).
+        """
+        for res in resources.get().eligible(service_id):
+            if self._free_gaps(res).fits(start, end):
+                return res.id
+        return None
+
+    def _busy_prefix(self, resource_set):
+        occ = self._occupancy(resource_set)
+        if self._prefix is None:
+            self._prefix = list(accumulate(occ.translate(_BUSY_TABLE), initial=0))
+        return self._prefix
+
+    def fits(self, start, end):
+        """True si [start, end) está completamente libre."""
+        if self.closed:
+            return False
+        prefix = self._busy_prefix(resources.get())
+        return prefix[end] - prefix[start] == 0
+
+    def conflict(self, start, end, service_id=None):
+        """
+        Tipo del primer minuto ocupado en [start, end), o FREE. Con recursos
+        cargados, BOOKED si ninguno de los que hacen el servicio está libre.
+        """
+        if self.closed:
+            return CLOSED
+        resource_set = resources.get()
+        prefix = self._busy_prefix(resource_set)
+        if prefix[end] != prefix[start]:
+            return next(k for k in self._occupancy(resource_set)[start:end] if k)
+        if resource_set and self.free_resource(start, end, service_id) is None:
+            return BOOKED
+        return FREE
+
+    def free_starts(self, duration=None, step=None, service_id=None):
+        """
+        Inicios libres (minutos). Sin duración solo se exige que la hora de
+        inicio esté libre; con duración, que todo el servicio quepa y termine
+        antes del cierre de su turno. Cada inicio cuesta O(1) sin importar el
+        paso (15/30/60) ni cuántas citas haya en el día.
+
+        Con recursos cargados, además debe haber al menos un recurso que haga
+        el servicio con un hueco para el inicio: los rangos de inicio válidos
+        de todos ellos se unen una vez y se recorren junto con las horas.
+        """
+        if self.closed:
+            return []
+        tpl = slot_template(self.date, step)
+        if not tpl.starts:
+            return []  # día sin horario de atención
+        resource_set = resources.get()
+        prefix = self._busy_prefix(resource_set)
+        if duration:
+            starts = [
+                s for s, limit in zip(tpl.starts, tpl.limits)
+                if s + duration <= limit and prefix[s + duration] == prefix[s]
+            ]
+        else:
+            starts = [s for s in tpl.starts if prefix[s + 1] == prefix[s]]
+
+        if not resource_set or not starts:
+            return starts
+        ranges = []
+        for res in resource_set.eligible(service_id):
+            ranges += self._free_gaps(res).start_ranges(duration or 1)
+        allowed = merge_ranges(ranges)
+
+        # Horas y rangos están ordenados: un solo recorrido de ambos
+        out = []
+        i, n = 0, len(allowed)
+        for s in starts:
+            while i < n and allowed[i][1] < s:
+                i += 1
+            if i == n:
+                break
+            if allowed[i][0] <= s:
+                out.append(s)
+        return out
+
+    def free_times(self, duration=None, step=None, service_id=None):
+        """Igual que free_starts pero como strings 'HH:MM'."""
+        return [_LABELS[s] for s in self.free_starts(duration, step, service_id)]
+
+
+def load_schedules(start_date, end_date):
+    """
+    {fecha: DaySchedule} para cada día en [start_date, end_date].
+    Una consulta para Appointment y otra para BlockedSlot, sin instanciar modelos.
+    """
+    days = {}
+    d = start_date
+    while d <= end_date:
+        days[d] = DaySchedule(d)
+        d += timedelta(days=1)
+
+    appts = (
+        Appointment.objects
+        .filter(date__range=(start_date, end_date))
+        .values_list("date", "time", "end_time", "resource_id")
+    )
+    blocks = (
+        BlockedSlot.objects
+        .filter(date__range=(start_date, end_date))
+        .values_list("date", "time", "start_time", "end_time")
+    )
+
+    # Citas primero para que, si se cruzan con un bloqueo, gane el bloqueo
+    for day, t, et, resource_id in appts:
+        sched = days[day]
+        if resource_id is None:
+            sched.mark(to_minutes(t), to_minutes(et), BOOKED)
+        else:
+            sched.book(resource_id, to_minutes(t), to_minutes(et))
+
+    points = []
+    for day, t, st, et in blocks:
+        sched = days[day]
+        if st and et:
+            sched.mark(to_minutes(st), to_minutes(et), BLOCKED_RANGE)
+        elif t:
+            points.append((sched, to_minutes(t)))
+        else:
+            sched.closed = True  # día completo
+
+    # Bloqueos recurrentes (evaluados en memoria, sin filas por fecha)
+    rules = block_rules.get()
+    if rules:
+        for day, intervals in rules.blocked_intervals_range(start_date, end_date).items():
+            sched = days[day]
+            for st, et, _reason in intervals:
+                if st is FULL_DAY:
+                    sched.closed = True
+                else:
+                    sched.mark(st, et, BLOCKED_RANGE)
+
+    for sched, start in points:
+        sched.mark(start, start + POINT_BLOCK_MINUTES, BLOCKED_POINT)
+
+    return days
+
+
+def load_schedule(day):
+    """DaySchedule de un solo día."""
+    return load_schedules(day, day)[day]
+
+
+# ---------- Búsqueda de la próxima hora libre ----------
+
+SEARCH_CHUNK_DAYS = 14  # días que se cargan de una vez (una consulta por tabla)
+
+
+def next_available(after, duration=None, limit=1, horizon_days=90, service_id=None):
+    """
+    Primeras `limit` horas libres [(fecha, minutos), ...] desde `after`
+    (inclusive) hasta `after + horizon_days` (con algún recurso que haga
+    `service_id`, si hay recursos cargados). Recorre el calendario por tramos
+    de SEARCH_CHUNK_DAYS días precargados en bloque; los días sin horario de
+    atención y los bloqueados completos se saltan sin mirarlos.
+
+    Nunca devuelve algo pasado: `after` no baja de hoy y hoy solo cuentan
+    las horas desde ahora.
+    """
+    hours = business_hours.get()
+    now = timezone.localtime()
+    today = now.date()
+    now_minutes = now.hour * 60 + now.minute
+    after = max(after, today)
+    found = []
+    last_day = after + timedelta(days=horizon_days - 1)
+    chunk_start = after
+
+    while chunk_start <= last_day and len(found) < limit:
+        chunk_end = min(chunk_start + timedelta(days=SEARCH_CHUNK_DAYS - 1), last_day)
+        for day, sched in get_schedules(chunk_start, chunk_end).items():
+            if sched.closed or not hours.shifts(day.weekday()):
+                continue
+            for start in sched.free_starts(duration, service_id=service_id):
+                if day == today and start < now_minutes:
+                    continue
+                found.append((day, start))
+                if len(found) >= limit:
+                    return found
+        chunk_start = chunk_end + timedelta(days=1)
+
+    return found
+
+
+# ---------- Caché por día ----------
+
+CACHE_PREFIX = "citas:avail"
+CACHE_TIMEOUT = getattr(settings, "AVAILABILITY_CACHE_TIMEOUT", 60 * 60 * 24)
+_HITS_KEY = f"{CACHE_PREFIX}:hits"
+_MISSES_KEY = f"{CACHE_PREFIX}:misses"
+
+
+def _day_key(day, rules_version):
+    # La versión de las reglas recurrentes va en la clave: si cambian, todos
+    # los días cacheados quedan obsoletos de una vez.
+    return f"{CACHE_PREFIX}:day:{rules_version}:{day.isoformat()}"
+
+
+def _count(key, n):
+    """Contador compartido entre workers (incr atómico en Redis)."""
+    if not n:
+        return
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, n)
+    except ValueError:
+        # La clave expiró/desalojó entre add() e incr()
+        cache.set(key, n, timeout=None)
+
+
+def get_schedules(start_date, end_date):
+    """
+    Igual que load_schedules pero pasando por la caché: solo se consulta la
+    base de datos (una vez por tabla) para el tramo de días que faltan.
+    """
+    days = []
+    d = start_date
+    while d <= end_date:
+        days.append(d)
+        d += timedelta(days=1)
+
+    rules_version = block_rules.version()
+    keys = {_day_key(day, rules_version): day for day in days}
+    cached = cache.get_many(keys)
+    result = {keys[k]: sched for k, sched in cached.items()}
+
+    missing = [day for day in days if day not in result]
+    _count(_HITS_KEY, len(result))
+    _count(_MISSES_KEY, len(missing))
+
+    if missing:
+        loaded = load_schedules(missing[0], missing[-1])
+        fresh = {day: loaded[day] for day in missing}
+        cache.set_many(
+            {_day_key(day, rules_version): sched for day, sched in fresh.items()},
+            CACHE_TIMEOUT,
+        )
+        result.update(fresh)
+
+    return {day: result[day] for day in days}
+
+
+def get_schedule(day):
+    """DaySchedule de un día, desde la caché si está."""
+    return get_schedules(day, day)[day]
+
+
+def invalidate_dates(dates):
+    """Borra de la caché la ocupación de esas fechas."""
+    rules_version = block_rules.version()
+    keys = [_day_key(day, rules_version) for day in set(dates) if day]
+    if keys:
+        cache.delete_many(keys)
+
+
+def invalidate_dates_on_commit(dates):
+    """
+    Para las señales: borra las fechas cuando el cambio ya es visible. Si se
+    borraran antes del commit, una lectura concurrente volvería a guardar la
+    agenda vieja (sin la cita nueva) hasta que venza la caché.
+    """
+    dates = [day for day in dates if day]
+    transaction.on_commit(lambda: invalidate_dates(dates))
+
+
+def cache_stats():
+    """{"hits": n, "misses": n, "hit_rate": 0..1} acumulados en la caché."""
+    hits = cache.get(_HITS_KEY, 0)
+    misses = cache.get(_MISSES_KEY, 0)
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": (hits / total) if total else 0.0}
+
+
+def reset_cache_stats():
+    cache.delete_many([_HITS_KEY, _MISSES_KEY])
@@ -0,0 +1,66 @@
+# salon/citas/booking.py
+"""
+Escritura de reservas sin carreras.
+
+Dos clientas pueden enviar a la vez 10:00 (2h) y 11:00 (1h): cada una valida
+contra la agenda que leyó y las dos citas se guardarían. Para evitarlo, cada
+reserva toma el candado de su fecha (BookingDayLock) antes de leer la agenda
+del día; la segunda espera a que la primera termine y ya la ve al validar,
+así que recibe el error normal de "se solapa".
+
+Solo se serializan reservas del MISMO día; días distintos no compiten.
+"""
+from contextlib import contextmanager
+
+from django import forms
+from django.db import transaction
+from django.utils import timezone
+
+from .availability import load_schedule
+from .forms import AppointmentForm
+from .models import BookingDayLock
+
+
+def _take_lock(day):
+    # UPDATE: candado de fila en Postgres y candado de escritura en SQLite
+    return BookingDayLock.objects.filter(date=day).update(locked_at=timezone.now())
+
+
+@contextmanager
+def day_lock(day):
+    """Transacción con el candado de la fecha `day` tomado."""
+    with transaction.atomic():
+        if not _take_lock(day):
+            # Primera reserva del día: crear la fila (si otra la crea a la vez,
+            # el conflicto se ignora) y tomar el candado.
+            BookingDayLock.objects.bulk_create(
+                [BookingDayLock(date=day)], ignore_conflicts=True
+            )
+            _take_lock(day)
+        yield
+
+
+def _parse_day(value):
+    try:
+        return forms.DateField().clean(value)
+    except forms.ValidationError:
+        return None
+
+
+def book_appointment(data):
+    """
+    Valida y guarda una reserva (datos del POST) con el día bloqueado.
+    Devuelve (form, cita) — cita es None si el formulario no es válido.
+    """
+    day = _parse_day(data.get("date"))
+    if day is None:
+        # Sin fecha válida el formulario no puede pasar: no hace falta candado
+        form = AppointmentForm(data)
+        form.is_valid()
+        return form, None
+
+    with day_lock(day):
+        # Agenda leída ya con el candado: incluye cualquier reserva recién hecha
+        form = AppointmentForm(data, schedule=load_schedule(day))
+        appointment = form.save() if form.is_valid() else None
+    return form, appointment
@@ -0,0 +1,113 @@
+# salon/citas/catalog.py
+"""
+Catálogo público (servicios, paquetes, fondo del inicio) armado una vez por
+proceso.
+
+Solo cambia cuando la dueña edita algo en el admin, así que home(),
+servicios() y el <select> de servicios del formulario de reservas leen este
+snapshot en vez de consultar y formatear en cada request. Las señales lo
+invalidan (citas/signals.py); la versión vive en la caché compartida, igual
+que las reglas y los horarios (citas/snapshots.py).
+
+Todo es inmutable (tuplas y namedtuples): el mismo objeto se comparte entre
+requests e hilos.
+"""
+from collections import namedtuple
+
+from .images import responsive_image
+from .models import HomeBackground, Package, Service
+from .snapshots import ProcessSnapshot
+from .templatetags.beauty_extras import price_dots
+
+CatalogService = namedtuple("CatalogService", "id name color duration_minutes")
+
+# image: ResponsiveImage (citas/images.py) o None;
+# formatted_price: "15.000", o "" si no se muestra el precio
+CatalogPackage = namedtuple(
+    "CatalogPackage", "id title description image show_price price formatted_price"
+)
+
+
+class Catalog:
+    __slots__ = (
+        "category_groups",
+        "uncategorized",
+        "service_choices",
+        "public_packages",
+        "vip_packages",
+        "background",
+    )
+
+    def __init__(self, category_groups, uncategorized, public_packages, vip_packages, background):
+        # category_groups: ((nombre, (servicio, ...)), ...) en orden de
+        # presentación; uncategorized: servicios activos sin categoría
+        self.category_groups = category_groups
+        self.uncategorized = uncategorized
+        self.service_choices = tuple(
+            (s.id, s.name)
+            for s in sorted(
+                [s for _, items in category_groups for s in items] + list(uncategorized),
+                key=lambda s: s.name,
+            )
+        )
+        self.public_packages = public_packages
+        self.vip_packages = vip_packages
+        self.background = background  # ResponsiveImage o None
+
+    def service_groups(self, max_categories=None):
+        """
+        ((nombre, servicios), ...): categorías en orden alfabético, las
+        llamadas "Otros" después, y al final los servicios sin categoría bajo
+        "Otros". Categorías sin servicios activos no aparecen.
+        """
+        groups = self.category_groups[:max_categories]
+        if self.uncategorized:
+            groups += (("Otros", self.uncategorized),)
+        return groups
+
+
+def _package(pkg):
+    return CatalogPackage(
+        id=pkg.pk,
+        title=pkg.title,
+        description=pkg.description,
+        image=responsive_image(pkg.image, pkg.image_variants),
+        show_price=pkg.show_price,
+        price=pkg.price,
+        formatted_price=price_dots(pkg.price) if pkg.show_price and pkg.price else "",
+    )
+
+
+def _build():
+    by_category = {}
+    uncategorized = []
+    for svc in Service.objects.filter(active=True).select_related("category").order_by("name"):
+        item = CatalogService(svc.pk, svc.name, svc.color, svc.duration_minutes)
+        if svc.category_id is None:
+            uncategorized.append(item)
+        else:
+            by_category.setdefault(svc.category_id, (svc.category.name, []))[1].append(item)
+    category_groups = tuple(
+        (name, tuple(items))
+        for name, items in sorted(
+            by_category.values(),
+            key=lambda group: (group[0].strip().lower() == "otros", group[0]),
+        )
+    )
+
+    public, vip = [], []
+    for pkg in Package.objects.filter(active=True).order_by("title"):
+        (vip if pkg.vip_only else public).append(_package(pkg))
+
+    background = HomeBackground.objects.filter(active=True).first()
+
+    return Catalog(
+        category_groups=category_groups,
+        uncategorized=tuple(uncategorized),
+        public_packages=tuple(public),
+        vip_packages=tuple(vip),
+        background=responsive_image(background.image, background.image_variants) if background else None,
+    )
+
+
+catalog = ProcessSnapshot("catalog", _build)
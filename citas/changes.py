@@ -0,0 +1,102 @@
+# salon/citas/changes.py
+"""
+Sincronización incremental del calendario (/api/appointments/changes/).
+
+Las señales anotan cada alta, edición o baja de citas y bloqueos en
+ScheduleChange. El cliente guarda el token (seq del último cambio visto) y
+pide solo lo posterior: recibe los eventos actuales de lo que cambió y los
+ids de lo que ya no existe. Si hubo un cambio que afecta a todos los eventos
+(servicio, regla, recurso), demasiados cambios, o el token es anterior a lo
+que se conserva, responde "reset" y el cliente recarga el feed completo.
+
+El token no puede ser el id: los ids se reparten al insertar, y una
+transacción larga puede confirmar el id 7 después de que un cliente ya
+recibió el 8; ese cambio no le llegaría nunca. Por eso cada cambio recibe
+su `seq` recién después del commit, de a uno (bloqueando la fila de
+ScheduleVersion): todo seq que aparezca más adelante es mayor que los que
+ya se vieron. Mientras no tiene seq, el cambio no se entrega.
+"""
+from django.db import transaction
+from django.db.models import F, Max
+
+from .feed import (
+    appointment_event_id,
+    appointment_events_by_id,
+    block_event_id,
+    block_events_by_id,
+)
+from .models import ScheduleChange, ScheduleVersion
+
+MAX_CHANGES = 500  # más que esto: conviene recargar todo
+
+
+def record_change(kind, object_id=None):
+    """Anota el cambio; su seq se asigna cuando se confirma la transacción."""
+    change = ScheduleChange.objects.create(kind=kind, object_id=object_id)
+    transaction.on_commit(lambda: stamp_change(change))
+    return change
+
+
+def stamp_change(change):
+    """Le da al cambio el siguiente seq, de a un proceso por vez."""
+    with transaction.atomic():
+        # Actualizar la fila toma su lock (en SQLite, el de escritura)
+        if not ScheduleVersion.objects.filter(pk=1).update(counter=F("counter")):
+            ScheduleVersion.objects.get_or_create(pk=1)
+            ScheduleVersion.objects.filter(pk=1).update(counter=F("counter"))
+        change.seq = current_token() + 1
+        ScheduleChange.objects.filter(pk=change.pk).update(seq=change.seq)
+
+
+def current_token():
+    return ScheduleChange.objects.aggregate(last=Max("seq"))["last"] or 0
+
+
+def _reset():
+    return {"token": str(current_token()), "reset": True, "upserted": [], "deleted": []}
+
+
+def changes_since(since):
+    """
+    {"token", "reset", "upserted": [eventos], "deleted": [ids]} con lo que
+    cambió después del token `since` (None = sin token: recargar todo).
+    """
+    if since is None:
+        return _reset()
+
+    rows = list(
+        ScheduleChange.objects.filter(seq__gt=since)
+        .order_by("seq")
+        .values_list("seq", "kind", "object_id")[: MAX_CHANGES + 1]
+    )
+    if not rows:
+        return {"token": str(since), "reset": False, "upserted": [], "deleted": []}
+
+    # El primer cambio posterior debería ser since + 1; si hay un hueco puede
+    # ser que se hayan podado cambios que el cliente no vio.
+    first = rows[0][0]
+    if (
+        len(rows) > MAX_CHANGES
+        or any(kind == ScheduleChange.RESET for _, kind, _ in rows)
+        or (first > since + 1 and not ScheduleChange.objects.filter(seq__lte=since).exists())
+    ):
+        return _reset()
+
+    appointment_ids = {oid for _, kind, oid in rows if kind == ScheduleChange.APPOINTMENT}
+    block_ids = {oid for _, kind, oid in rows if kind == ScheduleChange.BLOCK}
+    upserted = []
+    if appointment_ids:
+        upserted += appointment_events_by_id(appointment_ids)
+    if block_ids:
+        upserted += block_events_by_id(block_ids)
+
+    # Lo que cambió y ya no está: lápidas
+    present = {e["id"] for e in upserted}
+    changed = [appointment_event_id(pk) for pk in sorted(appointment_ids)]
+    changed += [block_event_id(pk) for pk in sorted(block_ids)]
+    return {
+        "token": str(rows[-1][0]),
+        "reset": False,
+        "upserted": upserted,
+        "deleted": [eid for eid in changed if eid not in present],
+    }
@@ -0,0 +1,143 @@
+# salon/citas/feed.py
+"""
+Eventos del calendario (/api/appointments/) armados desde tuplas.
+
+Las citas y bloqueos se leen con values_list(...).iterator(chunk_size): no se
+instancian modelos ni se junta la lista completa en memoria. stream_json_array
+escribe el arreglo JSON por tandas para StreamingHttpResponse, con los mismos
+bytes que JsonResponse(lista, safe=False) para los mismos datos.
+
+Citas y bloqueos llevan "id" ("appointment-<pk>" / "block-<pk>") para que el
+cliente pueda aplicar los cambios de /api/appointments/changes/.
+"""
+from datetime import datetime, time as dtime, timedelta
+from itertools import chain
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .availability import to_time
+from .models import Appointment, BlockedSlot
+from .rules import FULL_DAY, block_rules
+
+CHUNK_SIZE = 2000     # filas por viaje a la base de datos
+BATCH_EVENTS = 500    # eventos por trozo de respuesta
+
+DEFAULT_COLOR = "#0d6efd"
+BLOCK_COLOR = "#adb5bd"
+
+
+def appointment_event_id(pk):
+    return f"appointment-{pk}"
+
+
+def block_event_id(pk):
+    return f"block-{pk}"
+
+
+def appointment_events(start, end):
+    return _appointment_events(Appointment.objects.filter(date__range=(start, end)))
+
+
+def appointment_events_by_id(pks):
+    return _appointment_events(Appointment.objects.filter(pk__in=pks))
+
+
+def _appointment_events(qs):
+    rows = (
+        qs
+        .order_by("date", "time")
+        .values_list(
+            "pk", "date", "time", "end_time", "customer_name",
+            "service__name", "service__color", "resource__name",
+        )
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    combine = datetime.combine
+    for pk, day, t, et, customer, service_name, service_color, resource_name in rows:
+        yield {
+            "id": appointment_event_id(pk),
+            "title": f"{customer} - {service_name if service_name is not None else ''}",
+            "start": combine(day, t).isoformat(),
+            "end": combine(day, et).isoformat(),  # fin guardado al reservar
+            "color": service_color if service_name is not None else DEFAULT_COLOR,
+            "resource": resource_name,
+        }
+
+
+def _block_event(title_reason, start_dt, end_dt, pk=None):
+    event = {"id": block_event_id(pk)} if pk is not None else {}
+    event.update({
+        "title": f"Bloqueo{f' - {title_reason}' if title_reason else ''}",
+        "start": start_dt.isoformat(),
+        "end": end_dt.isoformat(),
+        "display": "background",
+        "color": BLOCK_COLOR,
+    })
+    return event
+
+
+def block_events(start, end):
+    """Bloqueos (rango, puntual de 1h o día completo) como fondo."""
+    return _block_events(BlockedSlot.objects.filter(date__range=(start, end)))
+
+
+def block_events_by_id(pks):
+    return _block_events(BlockedSlot.objects.filter(pk__in=pks))
+
+
+def _block_events(qs):
+    rows = (
+        qs
+        .order_by("date")
+        .values_list("pk", "date", "time", "start_time", "end_time", "reason")
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    for pk, day, t, st, et, reason in rows:
+        if st and et:
+            start_dt = datetime.combine(day, st)
+            end_dt = datetime.combine(day, et)
+        elif t:
+            start_dt = datetime.combine(day, t)
+            end_dt = start_dt + timedelta(minutes=60)
+        else:
+            start_dt = datetime.combine(day, dtime(0, 0))
+            end_dt = datetime.combine(day, dtime(23, 59))
+        yield _block_event(reason, start_dt, end_dt, pk)
+
+
+def rule_events(start, end):
+    """Bloqueos recurrentes expandidos solo para la ventana."""
+    for day, intervals in block_rules.get().blocked_intervals_range(start, end).items():
+        for st, et, reason in intervals:
+            if st is FULL_DAY:
+                start_dt = datetime.combine(day, dtime(0, 0))
+                end_dt = datetime.combine(day, dtime(23, 59))
+            else:
+                start_dt = datetime.combine(day, to_time(st))
+                end_dt = datetime.combine(day, to_time(et))
+            yield _block_event(reason, start_dt, end_dt)
+
+
+def calendar_events(start, end):
+    """Todos los eventos de [start, end] (fechas), en el orden de siempre."""
+    return chain(appointment_events(start, end), block_events(start, end), rule_events(start, end))
+
+
+def stream_json_array(items, batch=BATCH_EVENTS):
+    """
+    Trozos de texto de un arreglo JSON con `items`, codificados como
+    JsonResponse (DjangoJSONEncoder, separadores por defecto).
+    """
+    encode = DjangoJSONEncoder().encode
+    yield "["
+    parts = []
+    first = True
+    for item in items:
+        parts.append(encode(item) if first else ", " + encode(item))
+        first = False
+        if len(parts) >= batch:
+            yield "".join(parts)
+            parts = []
+    if parts:
+        yield "".join(parts)
+    yield "]"
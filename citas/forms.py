@@ -8,31 +8,69 @@ Created on Tue Oct 28 21:31:45 2025
 
 
 # salon/citas/forms.py
-from datetime import datetime, timedelta, time as dtime
+from datetime import time as dtime
 from django import forms
 from django.utils import timezone
-from .models import Appointment, BlockedSlot, Service
+from .models import Appointment, Service
+from .availability import (
+    BOOKED,
+    BLOCKED_RANGE,
+    BLOCKED_POINT,
+    format_minutes,
+    load_schedule,
+    to_minutes,
+)
+from .catalog import catalog
+from .hours import SLOT_MINUTES, slot_template
+
+# Mensaje por tipo de conflicto que devuelve DaySchedule.conflict()
+CONFLICT_ERRORS = {
+    BLOCKED_POINT: "Ese horario está bloqueado. Elegí otra hora.",
+    BLOCKED_RANGE: "Ese horario cae dentro de un rango bloqueado. Elegí otra hora.",
+    BOOKED: "Ese horario se solapa con otra cita. Elegí otra hora.",
+}
+
+
+def _hours_error(shifts):
+    """Mensaje de hora fuera de horario, con los turnos del día."""
+    every = "en horas en punto" if SLOT_MINUTES == 60 else f"cada {SLOT_MINUTES} minutos"
+    if len(shifts) == 1:
+        (open_min, close_min), = shifts
+        span = f"entre {format_minutes(open_min)} y {format_minutes(close_min)}"
+    else:
+        span = "en los turnos " + ", ".join(
+            f"{format_minutes(o)}-{format_minutes(c)}" for o, c in shifts
+        )
+    return f"El horario debe ser {every} {span}."
+
+
+class TimeChoiceField(forms.ChoiceField):
+    """
+    <select> de horas: muestra solo las libres, pero al validar acepta
+    cualquier valor. AppointmentForm.clean() revisa formato, horario y
+    choques, y así la clienta ve el motivo real ("se solapa con otra cita")
+    en vez de "no es una de las opciones disponibles".
+    """
 
-# Horario laboral
-OPEN_HOUR = 8     # 08:00
-CLOSE_HOUR = 20   # 20:00
-BUSINESS_HOURS = range(OPEN_HOUR, CLOSE_HOUR + 1)  # 08..20
+    def valid_value(self, value):
+        return True
 
 
 class AppointmentForm(forms.ModelForm):
     """
     El <select> de horas se llena desde la vista (y por JS) con SOLO horas disponibles.
-    Validaciones:
+    Validaciones (contra la ocupación del día de citas/availability.py):
       - Bloqueos (día completo / puntual / rango)
-      - Choque con otras citas (usando duración del servicio)
-      - Horario laboral (en punto)
-      - Que termine antes del cierre
+      - Choque con otras citas (usando duración del servicio); con estilistas /
+        sillas cargados, que haya alguno libre que haga el servicio (se asigna)
+      - Horario de atención del día (en punto, o cada APPOINTMENT_SLOT_MINUTES)
+      - Que termine antes del cierre de su turno
     """
     service = forms.ModelChoiceField(
         queryset=Service.objects.filter(active=True).order_by("name"),
         widget=forms.Select(attrs={'class': 'form-select'})  # id="id_service"
     )
-    time = forms.ChoiceField(
+    time = TimeChoiceField(
         choices=[],
         widget=forms.Select(attrs={'class': 'form-select', 'id': 'time-select'})
     )
@@ -60,8 +98,17 @@ class AppointmentForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         # Lista de horas disponibles llega desde la vista (['08:00','09:00',...])
         available_times = kwargs.pop('available_times', None)
+        # Ocupación del día ya cargada por la vista (DaySchedule); si viene,
+        # las horas y la validación salen de ahí sin volver a consultar.
+        self.schedule = kwargs.pop('schedule', None)
         super().__init__(*args, **kwargs)
+        # Opciones del <select> desde el catálogo en memoria (sin consulta);
+        # el queryset del campo sigue validando el servicio elegido.
+        service_field = self.fields['service']
+        service_field.choices = [("", service_field.empty_label), *catalog.get().service_choices]
+        self._set_time_choices(available_times)
 
+    def _set_time_choices(self, available_times):
         if available_times is None:
             self.fields['time'].choices = [("", "— Selecciona servicio y fecha —")]
         elif not available_times:
@@ -69,6 +116,26 @@ class AppointmentForm(forms.ModelForm):
         else:
             self.fields['time'].choices = [(t, t) for t in available_times]
 
+    def clean_service(self):
+        # Se limpia antes que 'time': con el servicio ya conocido, las horas
+        # que se vuelven a mostrar (si hay error) salen de la ocupación del
+        # día que trajo la vista.
+        service = self.cleaned_data.get('service')
+        if service is not None and self.schedule is not None:
+            self._set_time_choices(
+                self.schedule.free_times(
+                    getattr(service, 'duration_minutes', 60), service_id=service.pk
+                )
+            )
+        return service
+
+    def _get_validation_exclusions(self):
+        # El ModelChoiceField ya trajo el servicio de la base de datos; así el
+        # modelo no repite la consulta .exists() de ForeignKey.validate.
+        exclude = super()._get_validation_exclusions()
+        exclude.add('service')
+        return exclude
+
     def clean(self):
         cleaned = super().clean()
         date = cleaned.get('date')
@@ -85,56 +152,37 @@ class AppointmentForm(forms.ModelForm):
         except Exception:
             raise forms.ValidationError("Hora inválida.")
 
-        # 1) Día bloqueado
-        if BlockedSlot.objects.filter(
-            date=date,
-            start_time__isnull=True,
-            end_time__isnull=True,
-            time__isnull=True
-        ).exists():
-            raise forms.ValidationError("Ese día está bloqueado. Elegí otra fecha.")
+        # Ocupación del día (citas + bloqueos): la de la vista o, si no vino, del motor
+        schedule = self.schedule
+        if schedule is None or schedule.date != date:
+            schedule = load_schedule(date)
 
-        # 2) Bloqueo puntual
-        if BlockedSlot.objects.filter(date=date, time=start_time).exists():
-            raise forms.ValidationError("Ese horario está bloqueado. Elegí otra hora.")
-
-        # 3) Bloqueo por rango
-        for b in BlockedSlot.objects.filter(
-            date=date,
-            start_time__isnull=False,
-            end_time__isnull=False
-        ):
-            if b.start_time <= start_time < b.end_time:
-                raise forms.ValidationError(
-                    "Ese horario cae dentro de un rango bloqueado. Elegí otra hora."
-                )
+        # 1) Día bloqueado (o sin horario de atención)
+        template = slot_template(date)
+        if schedule.closed or not template.starts:
+            raise forms.ValidationError("Ese día está bloqueado. Elegí otra fecha.")
 
-        # 4) Dentro de horario laboral (en punto)
-        if start_time.hour not in BUSINESS_HOURS or start_time.minute != 0:
-            raise forms.ValidationError(
-                f"El horario debe ser en horas en punto entre "
-                f"{OPEN_HOUR:02}:00 y {CLOSE_HOUR:02}:00."
-            )
+        # 2) Dentro del horario de atención (en punto, o cada SLOT_MINUTES)
+        start_min = to_minutes(start_time)
+        limit = template.limit_for.get(start_min)
+        if limit is None or start_time.second:
+            raise forms.ValidationError(_hours_error(template.shifts))
 
-        # 5) Debe terminar antes del cierre
+        # 3) Debe terminar antes del cierre (de su turno)
         duration_min = getattr(service, 'duration_minutes', 60)
-        start_dt = datetime.combine(date, start_time)
-        end_dt = start_dt + timedelta(minutes=duration_min)
-        close_dt = datetime.combine(date, dtime(CLOSE_HOUR, 0))
-        if end_dt > close_dt:
+        end_min = start_min + duration_min
+        if end_min > limit:
             raise forms.ValidationError(
                 "El servicio no termina antes del cierre. Elegí otra hora."
             )
 
-        # 6) No solapar con otras citas (según duración de cada una)
-        for ap in Appointment.objects.select_related("service").filter(date=date):
-            ap_dur = getattr(ap.service, 'duration_minutes', 60) if getattr(ap, "service", None) else 60
-            ap_start = datetime.combine(date, ap.time)
-            ap_end = ap_start + timedelta(minutes=ap_dur)
-            if start_dt < ap_end and ap_start < end_dt:
-                raise forms.ValidationError(
-                    "Ese horario se solapa con otra cita. Elegí otra hora."
-                )
+        # 4) Bloqueos puntuales / por rango y choque con otras citas
+        reason = schedule.conflict(start_min, end_min, service.pk)
+        if reason:
+            raise forms.ValidationError(CONFLICT_ERRORS[reason])
+
+        # 5) Estilista / silla libre (None si el salón no tiene recursos cargados)
+        self.instance.resource_id = schedule.free_resource(start_min, end_min, service.pk)
 
         cleaned['time'] = start_time
         return cleaned
@@ -0,0 +1,47 @@
+# salon/citas/fragments.py
+"""
+Versiones de las secciones cacheadas de home.html ({% cache %}).
+
+Servicios, paquetes públicos, testimonios y fondo no dependen de quién
+visita la página: se renderizan una vez y se guardan en la caché con la
+versión de su contenido en la clave. Las señales cambian solo la versión de
+la sección afectada (citas/signals.py); la copia vieja deja de usarse y
+vence sola. La versión cambia después del commit: antes, otro request
+podría renderizar la sección sin el cambio y guardarla bajo la versión
+nueva. El formulario de reserva, el token CSRF y la sección VIP
+quedan fuera de la caché.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+SECTIONS = ("services", "packages", "testimonials", "background")
+
+KEY_PREFIX = "citas:fragment"
+# Segundos que vive cada sección renderizada (se reemplaza antes si cambia)
+TIMEOUT = 60 * 60 * 24
+
+
+def _key(section):
+    return f"{KEY_PREFIX}:{section}"
+
+
+def fragment_versions():
+    """{sección: versión} vigentes, en una lectura de caché."""
+    found = cache.get_many([_key(s) for s in SECTIONS])
+    versions = {}
+    for section in SECTIONS:
+        version = found.get(_key(section))
+        if version is None:
+            # Si la caché la perdió, se crea una nueva (y otro worker puede
+            # haberla creado primero)
+            cache.add(_key(section), uuid.uuid4().hex, timeout=None)
+            version = cache.get(_key(section))
+        versions[section] = version
+    return versions
+
+
+def invalidate_fragment(section):
+    """Versión nueva al confirmarse la transacción en curso (o ya, sin transacción)."""
+    transaction.on_commit(lambda: cache.set(_key(section), uuid.uuid4().hex, timeout=None))
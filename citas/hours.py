@@ -0,0 +1,110 @@
+# salon/citas/hours.py
+"""
+Horario de atención (BusinessHours) compilado en plantillas por día de la
+semana.
+
+Para cada weekday() y cada paso (15/30/60) se arma una sola vez la tupla de
+inicios posibles y, para cada inicio, el cierre del turno que lo contiene; la
+disponibilidad, el formulario y el admin solo recorren esas tuplas. Se
+reconstruye cuando cambia un horario (ver citas/signals.py).
+
+Si la tabla está vacía se usa el horario de siempre: lunes a sábado de 08:00
+a 20:00, domingo cerrado.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .models import BusinessHours
+from .snapshots import ProcessSnapshot
+
+# Cada cuántos minutos se puede empezar una cita (15, 30 o 60)
+SLOT_MINUTES = getattr(settings, "APPOINTMENT_SLOT_MINUTES", 60)
+if SLOT_MINUTES not in (15, 30, 60):
+    raise ImproperlyConfigured("APPOINTMENT_SLOT_MINUTES debe ser 15, 30 o 60.")
+
+# Horario por defecto (sin filas en BusinessHours)
+DEFAULT_OPEN_HOUR = 8
+DEFAULT_CLOSE_HOUR = 20
+DEFAULT_SHIFTS = tuple(
+    ((DEFAULT_OPEN_HOUR * 60, DEFAULT_CLOSE_HOUR * 60),) if wd < 6 else ()
+    for wd in range(7)
+)
+
+# starts: inicios posibles (minutos desde 00:00, ordenados)
+# limits: para cada inicio, el cierre de su turno (el servicio debe terminar antes)
+# limit_for: {inicio: cierre} para validar una hora puntual en O(1)
+# shifts: ((abre, cierra), ...) del día
+SlotTemplate = namedtuple("SlotTemplate", "starts limits limit_for shifts")
+
+_EMPTY = SlotTemplate((), (), {}, ())
+
+
+class HoursTable:
+    """Turnos por weekday() (0=lunes ... 6=domingo) y sus plantillas por paso."""
+    __slots__ = ("_shifts", "_templates")
+
+    def __init__(self, shifts_by_weekday):
+        self._shifts = tuple(tuple(sorted(s)) for s in shifts_by_weekday)
+        self._templates = {}
+
+    def shifts(self, weekday):
+        return self._shifts[weekday]
+
+    def template(self, weekday, step=None):
+        step = step or SLOT_MINUTES
+        key = (weekday, step)
+        tpl = self._templates.get(key)
+        if tpl is None:
+            tpl = self._templates[key] = self._compile(self._shifts[weekday], step)
+        return tpl
+
+    @staticmethod
+    def _compile(shifts, step):
+        if not shifts:
+            return _EMPTY
+        limit_for = {}
+        for open_min, close_min in shifts:
+            for s in range(open_min, close_min, step):
+                # Turnos solapados: vale el cierre más tardío
+                limit_for[s] = max(limit_for.get(s, 0), close_min)
+        starts = tuple(sorted(limit_for))
+        return SlotTemplate(
+            starts=starts,
+            limits=tuple(limit_for[s] for s in starts),
+            limit_for=limit_for,
+            shifts=shifts,
+        )
+
+    def all_times(self, step=None):
+        """Inicios y cierres de toda la semana (para los desplegables del admin)."""
+        minutes = set()
+        for wd in range(7):
+            minutes.update(self.template(wd, step).starts)
+            minutes.update(close for _open, close in self._shifts[wd])
+        return sorted(minutes)
+
+
+def _to_minutes(t):
+    return t.hour * 60 + t.minute
+
+
+def _build():
+    rows = list(BusinessHours.objects.values_list("weekday", "open_time", "close_time"))
+    if not rows:
+        return HoursTable(DEFAULT_SHIFTS)
+    by_weekday = [[] for _ in range(7)]
+    for wd, open_time, close_time in rows:
+        start, end = _to_minutes(open_time), _to_minutes(close_time)
+        if start < end:
+            by_weekday[wd].append((start, end))
+    return HoursTable(by_weekday)
+
+
+business_hours = ProcessSnapshot("business_hours", _build)
+
+
+def slot_template(day, step=None):
+    """Plantilla de inicios del día `day` (fecha) según el horario vigente."""
+    return business_hours.get().template(day.weekday(), step)
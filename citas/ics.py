@@ -0,0 +1,194 @@
+# salon/citas/ics.py
+"""
+Agenda en formato iCalendar (RFC 5545) para suscribirse desde el celular
+(/agenda/<token>.ics).
+
+Ventana móvil: desde DAYS_BACK días atrás hasta DAYS_AHEAD días adelante.
+Las apps de calendario consultan cada pocos minutos, así que el texto se
+guarda en caché por versión de la agenda (citas/versions.py) y fecha: una
+consulta sin cambios no toca la base de datos. Si no está en caché se arma
+por tandas desde tuplas (values_list + iterator) y se envía en streaming
+mientras se guarda.
+"""
+from datetime import datetime, time as dtime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .availability import to_time
+from .feed import CHUNK_SIZE, appointment_event_id, block_event_id
+from .models import Appointment, BlockedSlot
+from .rules import FULL_DAY, block_rules
+from .versions import schedule_version
+
+DAYS_BACK = 30
+DAYS_AHEAD = 180
+
+CACHE_PREFIX = "citas:ics"
+CACHE_TIMEOUT = 60 * 60 * 24
+MAX_CACHED_BYTES = 2 * 2**20  # un feed más grande se envía igual, sin guardarlo
+
+BATCH_LINES = 400
+PRODID = "-//Nadira Fashion Salon//Agenda//ES"
+UID_DOMAIN = "nadira-salon"
+CONTENT_TYPE = "text/calendar; charset=utf-8"
+
+
+def feed_window(today=None):
+    today = today or timezone.localdate()
+    return today - timedelta(days=DAYS_BACK), today + timedelta(days=DAYS_AHEAD)
+
+
+def cache_key(version, today):
+    return f"{CACHE_PREFIX}:{version}:{today.isoformat()}"
+
+
+def feed_etag(today=None):
+    counter, _ = schedule_version()
+    return f"ics-{counter}-{(today or timezone.localdate()).isoformat()}"
+
+
+def _escape(text):
+    # Un CR suelto (texto pegado en el admin con CRLF) rompería la línea
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return (
+        text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+    )
+
+
+def _fold(line):
+    """Corta líneas de más de 75 bytes (continuación con un espacio), sin partir caracteres."""
+    if len(line.encode()) <= 75:
+        return line
+    parts, current, size = [], "", 0
+    for ch in line:
+        n = len(ch.encode())
+        if size + n > (75 if not parts else 74):
+            parts.append(current)
+            current, size = "", 0
+        current += ch
+        size += n
+    parts.append(current)
+    return "\r\n ".join(parts)
+
+
+def _utc(day, t):
+    local = timezone.make_aware(datetime.combine(day, t))
+    return local.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _event(uid, stamp, summary, start_line, end_line, description=None):
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{uid}@{UID_DOMAIN}",
+        f"DTSTAMP:{stamp}",
+        start_line,
+        end_line,
+        f"SUMMARY:{_escape(summary)}",
+    ]
+    if description:
+        lines.append(f"DESCRIPTION:{_escape(description)}")
+    lines.append("END:VEVENT")
+    return lines
+
+
+def _timed(day, start, end):
+    return f"DTSTART:{_utc(day, start)}", f"DTEND:{_utc(day, end)}"
+
+
+def _all_day(day):
+    return (
+        f"DTSTART;VALUE=DATE:{day:%Y%m%d}",
+        f"DTEND;VALUE=DATE:{day + timedelta(days=1):%Y%m%d}",
+    )
+
+
+def calendar_lines(start, end, stamp):
+    """Líneas (sin CRLF) del VCALENDAR con citas, bloqueos y reglas de [start, end]."""
+    yield from ("BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{PRODID}",
+                "CALSCALE:GREGORIAN", "X-WR-CALNAME:Agenda Nadira")
+
+    appointments = (
+        Appointment.objects
+        .filter(date__range=(start, end))
+        .order_by("date", "time")
+        .values_list(
+            "pk", "date", "time", "end_time", "duration_minutes",
+            "customer_name", "customer_phone", "service__name", "resource__name",
+        )
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    for pk, day, t, et, minutes, customer, phone, service, resource in appointments:
+        details = [f"Servicio: {service or '-'} ({minutes} min)", f"Teléfono: {phone}"]
+        if resource:
+            details.append(f"Estilista / silla: {resource}")
+        yield from _event(
+            appointment_event_id(pk), stamp,
+            f"{customer} - {service}" if service else customer,
+            *_timed(day, t, et),
+            description="\n".join(details),
+        )
+
+    blocks = (
+        BlockedSlot.objects
+        .filter(date__range=(start, end))
+        .order_by("date")
+        .values_list("pk", "date", "time", "start_time", "end_time", "reason")
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    for pk, day, t, st, et, reason in blocks:
+        if st and et:
+            when = _timed(day, st, et)
+        elif t:
+            end_minute = min(t.hour * 60 + t.minute + 60, 24 * 60 - 1)
+            when = _timed(day, t, to_time(end_minute))
+        else:
+            when = _all_day(day)
+        yield from _event(block_event_id(pk), stamp, f"Bloqueo{f' - {reason}' if reason else ''}", *when)
+
+    for day, intervals in block_rules.get().blocked_intervals_range(start, end).items():
+        for i, (st, et, reason) in enumerate(intervals):
+            when = _all_day(day) if st is FULL_DAY else _timed(day, to_time(st), to_time(et))
+            yield from _event(
+                f"rule-{day:%Y%m%d}-{i}", stamp, f"Bloqueo{f' - {reason}' if reason else ''}", *when
+            )
+
+    yield "END:VCALENDAR"
+
+
+def calendar_chunks(start, end, stamp, batch=BATCH_LINES):
+    """Trozos de bytes del .ics (líneas plegadas, fin de línea CRLF)."""
+    parts = []
+    for line in calendar_lines(start, end, stamp):
+        parts.append(_fold(line))
+        if len(parts) >= batch:
+            yield ("\r\n".join(parts) + "\r\n").encode()
+            parts = []
+    if parts:
+        yield ("\r\n".join(parts) + "\r\n").encode()
+
+
+def cached_feed(today=None):
+    """Bytes del feed si ya está en caché para la versión y fecha vigentes."""
+    today = today or timezone.localdate()
+    counter, _ = schedule_version()
+    return cache.get(cache_key(counter, today))
+
+
+def streamed_feed(today=None):
+    """Genera el feed por tandas y, si no es muy grande, lo deja en caché al terminar."""
+    today = today or timezone.localdate()
+    counter, updated_at = schedule_version()
+    stamp = updated_at.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    start, end = feed_window(today)
+
+    kept, size = [], 0
+    for chunk in calendar_chunks(start, end, stamp):
+        size += len(chunk)
+        if kept is not None:
+            kept.append(chunk)
+            if size > MAX_CACHED_BYTES:
+                kept = None
+        yield chunk
+    if kept is not None:
+        cache.set(cache_key(counter, today), b"".join(kept), CACHE_TIMEOUT)
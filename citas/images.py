@@ -0,0 +1,147 @@
+# salon/citas/images.py
+"""
+Versiones livianas de las fotos subidas desde el admin (fondo del inicio,
+paquetes, antes/después de testimonios).
+
+Al guardar una imagen nueva las señales encolan la generación (citas/jobs.py,
+tarea images.refresh) y el worker arma copias de ancho fijo (WIDTHS) en WebP
+y JPEG, sin EXIF (ubicación del celular, etc.) y ya giradas según la
+orientación de la cámara. Se guardan con el storage del campo, así que
+funciona igual con MEDIA_ROOT local que con Cloudinary (CLOUDINARY_URL en
+settings.py). Lo que se generó queda anotado en un JSONField del modelo:
+
+    {"source": "packages/foto.jpg", "width": 4032, "height": 3024,
+     "webp": [[480, "packages/foto-480w.webp"], ...],
+     "jpeg": [[480, "packages/foto-480w.jpg"], ...]}
+
+Los templates usan {% responsive %} y {% picture %} (beauty_extras) para
+armar el <picture> con srcset; el navegador baja solo el ancho que necesita.
+"""
+import logging
+import os
+from collections import namedtuple
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = (480, 960, 1600)
+FORMATS = {
+    # formato -> (extensión, opciones de Pillow)
+    "webp": ("webp", {"format": "WEBP", "quality": 80, "method": 4}),
+    "jpeg": ("jpg", {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True}),
+}
+
+# Imagen lista para el template: src de respaldo (JPEG), versión WebP más
+# grande (fondos por CSS), medidas del original y srcset por formato
+ResponsiveImage = namedtuple("ResponsiveImage", "url webp_url width height srcset_webp srcset_jpeg")
+
+
+def _target_widths(width):
+    """Anchos a generar: los de WIDTHS menores al original, más el original (con tope)."""
+    widths = [w for w in WIDTHS if w < width]
+    widths.append(min(width, WIDTHS[-1]))
+    return sorted(set(widths))
+
+
+def _flatten(img):
+    """RGB para JPEG: la transparencia se pinta sobre blanco."""
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel("A"))
+        return background
+    return img.convert("RGB")
+
+
+def build_variants(field):
+    """
+    Genera las versiones del archivo de `field` (FieldFile con imagen) y
+    devuelve el dict para el JSONField. No guarda el modelo.
+    """
+    storage = field.storage
+    stem = os.path.splitext(field.name)[0]
+    with field.open("rb") as fh:
+        img = Image.open(fh)
+        img.load()
+    # Aplica la orientación de la cámara; las copias nuevas no llevan EXIF
+    img = _flatten(ImageOps.exif_transpose(img))
+    width, height = img.size
+
+    data = {"source": field.name, "width": width, "height": height}
+    for fmt, (ext, options) in FORMATS.items():
+        saved = []
+        for w in _target_widths(width):
+            h = max(1, round(height * w / width))
+            resized = img if w == width else img.resize((w, h), Image.LANCZOS)
+            buf = BytesIO()
+            resized.save(buf, **options)
+            name = storage.save(f"{stem}-{w}w.{ext}", ContentFile(buf.getvalue()))
+            saved.append([w, name])
+        data[fmt] = saved
+    return data
+
+
+def delete_variants(data, storage):
+    """Borra los archivos de un dict de versiones (imagen reemplazada o borrada)."""
+    for fmt in FORMATS:
+        for _, name in (data or {}).get(fmt, ()):
+            try:
+                storage.delete(name)
+            except Exception:
+                logger.exception("No se pudo borrar la versión %s", name)
+
+
+def variants_outdated(field, data):
+    """¿Las versiones anotadas no son de la imagen actual? (también si se quitó)"""
+    return (field.name or None) != (data or {}).get("source")
+
+
+def refresh_variants(instance, image_field, variants_field):
+    """
+    Si la imagen de `instance` cambió, genera sus versiones, borra las de
+    la imagen anterior y guarda el JSONField (save con update_fields, para
+    que las señales de caché se enteren). Sin imagen, limpia.
+
+    Un error del storage se propaga para que el worker reintente.
+    """
+    field = getattr(instance, image_field)
+    old = getattr(instance, variants_field) or {}
+    if not variants_outdated(field, old):
+        return
+    new = {}
+    if field:
+        try:
+            new = build_variants(field)
+        except UnidentifiedImageError:
+            # Un archivo que Pillow no entiende no mejora reintentando:
+            # se sigue mostrando el original
+            logger.exception("No se pudieron generar versiones de %s", field.name)
+            return
+    delete_variants(old, field.storage)
+    setattr(instance, variants_field, new)
+    instance.save(update_fields=[variants_field])
+
+
+def responsive_image(field, data):
+    """ResponsiveImage de un FieldFile y su dict de versiones (None sin imagen)."""
+    if not field:
+        return None
+    if not data or data.get("source") != field.name:
+        # Todavía sin versiones (o de una imagen anterior): el original
+        return ResponsiveImage(field.url, None, None, None, "", "")
+    url = field.storage.url
+    webp = data.get("webp", ())
+    jpeg = data.get("jpeg", ())
+    # Respaldo sin srcset: el JPEG de ancho medio
+    fallback = jpeg[len(jpeg) // 2][1] if jpeg else field.name
+    return ResponsiveImage(
+        url=url(fallback),
+        webp_url=url(webp[-1][1]) if webp else None,
+        width=data["width"],
+        height=data["height"],
+        srcset_webp=", ".join(f"{url(name)} {w}w" for w, name in webp),
+        srcset_jpeg=", ".join(f"{url(name)} {w}w" for w, name in jpeg),
+    )
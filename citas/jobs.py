@@ -0,0 +1,178 @@
+# salon/citas/jobs.py
+"""
+Cola de trabajos en la base de datos, sin broker externo.
+
+Lo lento (generar las versiones de las fotos, borrar archivos en Cloudinary,
+mandar los WhatsApp de una reserva) no corre en el request: enqueue() anota
+una fila Job y el worker (`manage.py run_jobs`, proceso aparte en el
+Procfile) la toma y la ejecuta en su pool de hilos.
+
+- La fila se crea en la misma transacción que el guardado que la pidió: si
+  el admin falla y se revierte, el trabajo tampoco existe, y el worker no lo
+  ve antes del commit.
+- Tomar un trabajo es un UPDATE condicionado a que siga como estaba, así que
+  dos workers (o dos hilos) nunca ejecutan el mismo.
+- Si la tarea lanza una excepción se reintenta con espera creciente
+  (RETRY_DELAY, el doble cada vez) hasta max_attempts; después queda
+  "failed" con el traceback en last_error, visible en el admin.
+- `concurrency` limita cuántos trabajos de una tarea corren a la vez entre
+  todos los workers (Pillow con fotos de 12 MP usa mucha memoria).
+- `uses_cache=False` marca las tareas que no cambian nada cacheado (mandar
+  un WhatsApp, borrar archivos): el worker las corre aunque la caché no sea
+  compartida (ver run_jobs).
+- Un trabajo "running" cuyo worker murió se vuelve a tomar pasado
+  LOCK_TIMEOUT, y eso cuenta como un intento: si ya usó max_attempts (una
+  foto que mata al worker cada vez) queda "failed".
+
+Las tareas viven en citas/tasks.py y reciben solo valores JSON (ids, nombres
+de campo), nunca objetos.
+"""
+import logging
+import traceback
+from collections import Counter, namedtuple
+from datetime import timedelta
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+RETRY_DELAY = timedelta(seconds=30)
+LOCK_TIMEOUT = timedelta(minutes=10)
+
+Task = namedtuple("Task", "func max_attempts concurrency uses_cache")
+
+_TASKS = {}
+
+
+def task(name, max_attempts=3, concurrency=None, uses_cache=True):
+    """Registra `func` como tarea `name` para enqueue() y el worker."""
+    def decorator(func):
+        _TASKS[name] = Task(func, max_attempts, concurrency, uses_cache)
+        return func
+
+    return decorator
+
+
+def cache_free_tasks():
+    """Nombres de las tareas que no tocan la caché."""
+    return sorted(name for name, spec in _TASKS.items() if not spec.uses_cache)
+
+
+def enqueue(name, key="", delay=None, **kwargs):
+    """
+    Encola la tarea `name` con `kwargs`. Con `key`, si ya hay uno pendiente
+    igual no se agrega otro (devuelve None).
+    """
+    if name not in _TASKS:
+        raise ValueError(f"Tarea desconocida: {name}")
+    if key and Job.objects.filter(key=key, status=Job.PENDING).exists():
+        return None
+    return Job.objects.create(
+        task=name,
+        key=key,
+        kwargs=kwargs,
+        run_after=timezone.now() + (delay or timedelta()),
+    )
+
+
+def claim(limit, tasks=None):
+    """
+    Toma hasta `limit` trabajos listos para correr (los marca "running") y
+    los devuelve, respetando `concurrency` y sin repetir una key en curso.
+    Con `tasks`, solo de esas tareas.
+    """
+    now = timezone.now()
+    stale = now - LOCK_TIMEOUT
+    in_flight = Job.objects.filter(status=Job.RUNNING, locked_at__gte=stale)
+    running = Counter(in_flight.values_list("task", flat=True))
+    busy_keys = set(in_flight.exclude(key="").values_list("key", flat=True))
+
+    candidates = Job.objects.filter(
+        Q(status=Job.PENDING, run_after__lte=now) | Q(status=Job.RUNNING, locked_at__lt=stale)
+    ).order_by("run_after", "pk")
+    if tasks is not None:
+        candidates = candidates.filter(task__in=tasks)
+    claimed = []
+    # Se miran algunos de más por si los primeros están limitados
+    for job in candidates[: limit * 4]:
+        if len(claimed) == limit:
+            break
+        spec = _TASKS.get(job.task)
+        if spec is None:
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.FAILED, last_error=f"Tarea desconocida: {job.task}", finished_at=now
+            )
+            continue
+        if job.status == Job.RUNNING and job.attempts >= spec.max_attempts:
+            Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_at=job.locked_at).update(
+                status=Job.FAILED,
+                locked_at=None,
+                last_error=f"El worker se cortó durante el intento {job.attempts} y no quedan más.",
+                finished_at=now,
+            )
+            continue
+        if spec.concurrency and running[job.task] >= spec.concurrency:
+            continue
+        if job.key and job.key in busy_keys:
+            continue
+        taken = Job.objects.filter(pk=job.pk, status=job.status, locked_at=job.locked_at).update(
+            status=Job.RUNNING, locked_at=now, attempts=F("attempts") + 1
+        )
+        if not taken:  # otro worker llegó primero
+            continue
+        job.status, job.locked_at, job.attempts = Job.RUNNING, now, job.attempts + 1
+        running[job.task] += 1
+        if job.key:
+            busy_keys.add(job.key)
+        claimed.append(job)
+    return claimed
+
+
+def run(job):
+    """Ejecuta un trabajo ya tomado y anota el resultado. True si salió bien."""
+    spec = _TASKS[job.task]
+    try:
+        spec.func(**job.kwargs)
+    except Exception:
+        logger.exception("Falló el trabajo %s (intento %d)", job, job.attempts)
+        error = traceback.format_exc()
+        now = timezone.now()
+        if job.attempts < spec.max_attempts:
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.PENDING,
+                locked_at=None,
+                last_error=error,
+                run_after=now + RETRY_DELAY * 2 ** (job.attempts - 1),
+            )
+        else:
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.FAILED, locked_at=None, last_error=error, finished_at=now
+            )
+        return False
+    Job.objects.filter(pk=job.pk).update(status=Job.DONE, locked_at=None, finished_at=timezone.now())
+    return True
+
+
+def run_pending():
+    """
+    Corre en este hilo todo lo que esté listo, hasta vaciar la cola (los
+    reintentos quedan para después). Para pruebas y `run_jobs --once`
+    sin hilos. Devuelve cuántos trabajos corrió.
+    """
+    count = 0
+    while True:
+        jobs = claim(1)
+        if not jobs:
+            return count
+        run(jobs[0])
+        count += 1
+
+
+def prune(days):
+    """Borra los trabajos terminados hace más de `days` días (los fallidos quedan)."""
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = Job.objects.filter(status=Job.DONE, finished_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,245 @@
+# salon/citas/live.py
+"""
+Avisos en vivo para el calendario del admin (server-sent events en
+/api/appointments/stream/).
+
+Cuando se confirma un cambio de cita o bloqueo, las señales publican un
+mensaje chico con el mismo formato que /api/appointments/changes/:
+{"token", "reset", "upserted": [evento], "deleted": [id]}. Cada conexión SSE
+abierta lo recibe y el calendario lo aplica sin recargar el feed.
+
+Backends (setting CALENDAR_LIVE_BACKEND):
+  - LocalBroadcaster: colas asyncio dentro del proceso (un solo worker).
+  - RedisBroadcaster: pub/sub de Redis (varios workers; pip install redis).
+
+La conexión SSE es una vista async: necesita servirse por ASGI
+(salon/asgi.py) para no ocupar un worker síncrono por cada admin conectado.
+"""
+import asyncio
+import json
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .changes import changes_since
+from .feed import (
+    appointment_event_id,
+    appointment_events_by_id,
+    block_event_id,
+    block_events_by_id,
+)
+from .models import ScheduleChange
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "citas:live"
+HEARTBEAT_SECONDS = 20   # comentario ": ping" para que proxies no corten la conexión
+MAX_STREAM_SECONDS = 300  # luego se cierra y EventSource reconecta (con Last-Event-ID)
+QUEUE_SIZE = 100
+RETRY_MS = 3000
+
+_RESET = json.dumps({"token": None, "reset": True, "upserted": [], "deleted": []})
+
+
+def _encode(message):
+    return json.dumps(message, cls=DjangoJSONEncoder)
+
+
+# ---------- Backend local (un proceso) ----------
+
+class _LocalSubscription:
+    def __init__(self, broadcaster):
+        self._broadcaster = broadcaster
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def put(self, data):
+        # Corre en el loop de la conexión (call_soon_threadsafe)
+        try:
+            self.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            # Cliente muy atrasado: se descarta lo pendiente y se pide recargar
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(_RESET)
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def aclose(self):
+        self._broadcaster._discard(self)
+
+
+class LocalBroadcaster:
+    """Colas asyncio por conexión dentro del proceso."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+
+    def has_listeners(self):
+        return bool(self._subscriptions)
+
+    def publish(self, message):
+        # Se llama desde código síncrono (señales), en cualquier hilo
+        data = _encode(message)
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for sub in subscriptions:
+            sub.loop.call_soon_threadsafe(sub.put, data)
+
+    def subscribe(self):
+        sub = _LocalSubscription(self)
+        with self._lock:
+            self._subscriptions.add(sub)
+        return sub
+
+    def _discard(self, sub):
+        with self._lock:
+            self._subscriptions.discard(sub)
+
+
+# ---------- Backend Redis (varios workers) ----------
+
+class _RedisSubscription:
+    def __init__(self, url):
+        self._url = url
+        self._client = None
+        self._pubsub = None
+
+    async def get(self, timeout):
+        if self._pubsub is None:
+            from redis import asyncio as aioredis
+
+            self._client = aioredis.from_url(self._url)
+            self._pubsub = self._client.pubsub()
+            await self._pubsub.subscribe(CHANNEL)
+        message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        if message is None:
+            return None
+        data = message["data"]
+        return data.decode() if isinstance(data, bytes) else data
+
+    async def aclose(self):
+        if self._pubsub is not None:
+            await self._pubsub.unsubscribe(CHANNEL)
+            await self._pubsub.close()
+            await self._client.close()
+
+
+class RedisBroadcaster:
+    """Pub/sub de Redis: un mensaje publicado en un worker llega a todos."""
+
+    def __init__(self):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("RedisBroadcaster necesita el paquete redis (pip install redis).")
+        self._url = getattr(settings, "REDIS_URL", None)
+        if not self._url:
+            raise ImproperlyConfigured("RedisBroadcaster necesita REDIS_URL.")
+        self._client = redis.Redis.from_url(self._url)
+
+    def has_listeners(self):
+        return True  # los oyentes pueden estar en otro worker
+
+    def publish(self, message):
+        self._client.publish(CHANNEL, _encode(message))
+
+    def subscribe(self):
+        return _RedisSubscription(self._url)
+
+
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+
+def get_broadcaster():
+    global _broadcaster
+    if _broadcaster is None:
+        with _broadcaster_lock:
+            if _broadcaster is None:
+                path = getattr(settings, "CALENDAR_LIVE_BACKEND", "citas.live.LocalBroadcaster")
+                _broadcaster = import_string(path)()
+    return _broadcaster
+
+
+@receiver(setting_changed)
+def _backend_changed(setting, **kwargs):
+    # override_settings (pruebas, benchmarks): el próximo aviso usa el backend nuevo
+    global _broadcaster
+    if setting in ("CALENDAR_LIVE_BACKEND", "REDIS_URL"):
+        _broadcaster = None
+
+
+# ---------- Publicar cambios ----------
+
+def change_message(change):
+    """Mensaje de un ScheduleChange, con el evento actual (o su id si se borró)."""
+    if change.kind == ScheduleChange.RESET:
+        return {"token": str(change.seq), "reset": True, "upserted": [], "deleted": []}
+    if change.kind == ScheduleChange.APPOINTMENT:
+        events, event_id = appointment_events_by_id([change.object_id]), appointment_event_id(change.object_id)
+    else:
+        events, event_id = block_events_by_id([change.object_id]), block_event_id(change.object_id)
+    upserted = list(events)
+    return {
+        "token": str(change.seq),
+        "reset": False,
+        "upserted": upserted,
+        "deleted": [] if upserted else [event_id],
+    }
+
+
+def publish_on_commit(change):
+    """Publica el cambio cuando se confirma la transacción (si hay quien escuche)."""
+    def publish():
+        broadcaster = get_broadcaster()
+        if not broadcaster.has_listeners():
+            return
+        try:
+            broadcaster.publish(change_message(change))
+        except Exception:
+            # Un aviso en vivo perdido no debe romper la reserva; el cliente
+            # se pone al día con el token al reconectar.
+            logger.exception("No se pudo publicar el cambio de agenda %s", change.pk)
+
+    transaction.on_commit(publish)
+
+
+# ---------- Conexión SSE ----------
+
+async def sse_stream(since=None):
+    """
+    Texto SSE para una conexión: primero lo que cambió después de `since`
+    (si el cliente trae token), luego cada cambio publicado, con latidos.
+    """
+    sub = get_broadcaster().subscribe()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + MAX_STREAM_SECONDS
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        if since is not None:
+            # Suscripto antes de leer: nada queda entre el token y el primer aviso
+            catch_up = await sync_to_async(changes_since)(since)
+            yield f"id: {catch_up['token']}\ndata: {_encode(catch_up)}\n\n"
+        while loop.time() < deadline:
+            data = await sub.get(HEARTBEAT_SECONDS)
+            if data is None:
+                yield ": ping\n\n"
+                continue
+            token = json.loads(data).get("token")
+            yield (f"id: {token}\n" if token else "") + f"data: {data}\n\n"
+    finally:
+        await sub.aclose()
@@ -0,0 +1,53 @@
+# citas/management/commands/_bench.py
+"""
+Entorno aislado de los benchmarks (bench_*): base de datos de prueba
+desechable (como `manage.py test`), caché en memoria propia y avisos en vivo
+locales. Así cache.clear() y las señales que disparan los datos de prueba no
+tocan la caché del sitio ni publican nada en Redis.
+
+El guion bajo del nombre hace que Django no lo liste como comando.
+"""
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+
+from citas.snapshots import reset_snapshots
+
+BENCH_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "bench"}}
+
+
+@contextmanager
+def bench_environment(media=False):
+    """
+    Corre el bloque en el entorno aislado. Con `media=True`, los archivos
+    subidos van a una carpeta temporal con FileSystemStorage (aunque el sitio
+    use Cloudinary) y se devuelve su ruta.
+    """
+    overrides = {"CACHES": BENCH_CACHES, "CALENDAR_LIVE_BACKEND": "citas.live.LocalBroadcaster"}
+    media_root = None
+    if media:
+        # Con solo MEDIA_ROOT, el storage por defecto seguiría siendo
+        # Cloudinary; FileSystemStorage guarda en MEDIA_ROOT
+        media_root = tempfile.mkdtemp()
+        overrides["MEDIA_ROOT"] = media_root
+        overrides["STORAGES"] = {
+            **settings.STORAGES,
+            "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+        }
+    old_name = connection.settings_dict["NAME"]
+    try:
+        with override_settings(**overrides):
+            reset_snapshots()
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                yield media_root
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                reset_snapshots()
+    finally:
+        if media_root:
+            shutil.rmtree(media_root, ignore_errors=True)
@@ -0,0 +1,21 @@
+# citas/management/commands/availability_cache_stats.py
+from django.core.management.base import BaseCommand
+
+from citas.availability import cache_stats, reset_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Muestra aciertos/fallos de la caché de disponibilidad (compartidos entre workers)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Pone los contadores en cero.")
+
+    def handle(self, *args, **options):
+        stats = cache_stats()
+        self.stdout.write(
+            f"Aciertos: {stats['hits']}  Fallos: {stats['misses']}  "
+            f"Tasa de acierto: {stats['hit_rate']:.1%}"
+        )
+        if options["reset"]:
+            reset_cache_stats()
+            self.stdout.write(self.style.SUCCESS("Contadores reiniciados."))
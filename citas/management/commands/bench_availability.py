@@ -0,0 +1,106 @@
+# citas/management/commands/bench_availability.py
+"""
+Benchmark del cálculo de horas libres con pasos de 60, 30 y 15 minutos en un
+día lleno. Compara el motor (sumas prefijas, O(1) por hora) con el bucle
+anterior (any() sobre cada rango ocupado por cada hora).
+
+El día se arma en memoria; de la base de datos solo se lee el horario de
+atención (citas/hours.py) del lunes de prueba.
+
+    python manage.py bench_availability --bookings 40 --repeat 2000
+"""
+import random
+from datetime import date, datetime, time as dtime, timedelta
+from timeit import timeit
+
+from django.core.management.base import BaseCommand
+
+from citas.availability import (
+    BLOCKED_RANGE,
+    BOOKED,
+    DaySchedule,
+    format_minutes,
+    to_time,
+)
+from citas.hours import slot_template
+
+
+def _legacy_free_times(slots, busy_ranges, blocked_ranges, day, duration, close_minute):
+    """Bucle de antes (views._available_times_for_date) con un paso cualquiera."""
+    free = []
+    close_dt = datetime.combine(day, to_time(close_minute))
+    for s in slots:
+        hh, mm = map(int, s.split(":"))
+        t_obj = dtime(hh, mm)
+        if any(st <= t_obj < et for (st, et) in blocked_ranges):
+            continue
+        if any(st <= t_obj < et for (st, et) in busy_ranges):
+            continue
+        if datetime.combine(day, t_obj) + timedelta(minutes=duration) > close_dt:
+            continue
+        free.append(s)
+    return free
+
+
+class Command(BaseCommand):
+    help = "Compara el cálculo de disponibilidad con pasos de 60, 30 y 15 minutos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bookings", type=int, default=40, help="Citas en el día.")
+        parser.add_argument("--blocks", type=int, default=4, help="Bloqueos por rango.")
+        parser.add_argument("--repeat", type=int, default=2000)
+        parser.add_argument("--duration", type=int, default=45, help="Duración consultada (min).")
+
+    def handle(self, *args, **options):
+        rnd = random.Random(1)
+        day = date(2030, 1, 7)
+        duration = options["duration"]
+        repeat = options["repeat"]
+
+        tpl = slot_template(day, 15)
+        if not tpl.starts:
+            self.stderr.write("El lunes no tiene horario de atención.")
+            return
+        open_minute, close_minute = tpl.starts[0], max(tpl.limits)
+
+        busy, blocked = [], []
+        for _ in range(options["bookings"]):
+            start = rnd.randrange(open_minute, close_minute, 15)
+            busy.append((start, start + rnd.choice((15, 30, 45, 60, 90, 120))))
+        for _ in range(options["blocks"]):
+            start = rnd.randrange(open_minute, close_minute, 30)
+            blocked.append((start, start + 60))
+
+        busy_ranges = [(to_time(s), to_time(min(e, 24 * 60 - 1))) for s, e in busy]
+        blocked_ranges = [(to_time(s), to_time(min(e, 24 * 60 - 1))) for s, e in blocked]
+
+        def build():
+            sched = DaySchedule(day)
+            for s, e in busy:
+                sched.mark(s, e, BOOKED)
+            for s, e in blocked:
+                sched.mark(s, e, BLOCKED_RANGE)
+            return sched
+
+        self.stdout.write(
+            f"Día con {len(busy)} citas y {len(blocked)} bloqueos, duración {duration} min, "
+            f"{repeat} repeticiones (µs por consulta)\n"
+        )
+        self.stdout.write(f"{'paso':>6} {'horas':>6} {'motor':>10} {'motor+armado':>14} {'bucle any()':>12}")
+
+        for step in (60, 30, 15):
+            labels = [format_minutes(m) for m in slot_template(day, step).starts]
+            sched = build()
+            sched.free_starts(duration, step)  # suma prefija ya calculada
+
+            engine = timeit(lambda: sched.free_times(duration, step), number=repeat)
+            engine_build = timeit(lambda: build().free_times(duration, step), number=repeat)
+            legacy = timeit(
+                lambda: _legacy_free_times(labels, busy_ranges, blocked_ranges, day, duration, close_minute),
+                number=repeat,
+            )
+            self.stdout.write(
+                f"{step:>5}m {len(labels):>6} "
+                f"{engine / repeat * 1e6:>10.1f} {engine_build / repeat * 1e6:>14.1f} "
+                f"{legacy / repeat * 1e6:>12.1f}"
+            )
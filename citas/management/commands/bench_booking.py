@@ -0,0 +1,87 @@
+# citas/management/commands/bench_booking.py
+"""
+Throughput de reservas simultáneas con el candado por día (citas/booking.py).
+
+En una base de datos y una caché desechables (_bench.py), lanza N hilos que
+reservan a la vez y mide reservas/segundo en dos escenarios:
+  - mismo día: todos compiten por el mismo candado (peor caso)
+  - días distintos: cada hilo reserva en su propio día (sin contención)
+
+    python manage.py bench_booking --threads 8 --attempts 25
+"""
+import random
+import threading
+import time
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from citas.availability import format_minutes
+from citas.booking import book_appointment
+from citas.hours import slot_template
+from citas.models import Appointment, Service
+
+from ._bench import bench_environment
+
+
+class Command(BaseCommand):
+    help = "Mide reservas/segundo con varios hilos reservando a la vez."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--attempts", type=int, default=25, help="Intentos por hilo.")
+
+    def handle(self, *args, **options):
+        with bench_environment():
+            self._bench(options)
+
+    def _bench(self, options):
+        service = Service.objects.create(name="Bench", duration_minutes=15)
+        first_day = date(2030, 1, 7)  # lunes
+        n = options["threads"]
+        attempts = options["attempts"]
+
+        self.stdout.write(f"{n} hilos x {attempts} intentos (servicio de 15 min)\n")
+        self.stdout.write(f"{'escenario':<16} {'seg':>6} {'intentos/s':>11} {'guardadas':>10} {'rechazos':>9}")
+
+        for label, same_day in (("mismo día", True), ("días distintos", False)):
+            Appointment.objects.all().delete()
+            cache.clear()
+            elapsed, saved, rejected = self._run(service, first_day, n, attempts, same_day)
+            self.stdout.write(
+                f"{label:<16} {elapsed:>6.2f} {n * attempts / elapsed:>11.1f} "
+                f"{saved:>10} {rejected:>9}"
+            )
+
+    def _run(self, service, first_day, n, attempts, same_day):
+        barrier = threading.Barrier(n)
+        counts = {"saved": 0, "rejected": 0}
+        lock = threading.Lock()
+        hours = [format_minutes(m) for m in slot_template(first_day).starts]
+
+        def worker(i):
+            rnd = random.Random(i)
+            # Mismo día para todos, o un lunes distinto para cada hilo
+            day = first_day if same_day else first_day + timedelta(weeks=i)
+            try:
+                barrier.wait()
+                for _ in range(attempts):
+                    _, ap = book_appointment({
+                        "customer_name": f"Bench {i}", "customer_phone": "88888888",
+                        "service": service.pk, "date": day.isoformat(),
+                        "time": rnd.choice(hours),
+                    })
+                    with lock:
+                        counts["saved" if ap else "rejected"] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.perf_counter() - started, counts["saved"], counts["rejected"]
@@ -0,0 +1,118 @@
+# citas/management/commands/bench_feed.py
+"""
+Memoria y tiempo de /api/appointments/: lista de dicts + JsonResponse (a la
+manera de antes, con instancias de modelo) contra el streaming por tuplas de
+citas/feed.py. Verifica además que lo transmitido sea JSON válido y byte a
+byte lo que daría JsonResponse con esos mismos eventos.
+
+Cargar y borrar las citas dispara señales: corre en el entorno aislado de
+_bench.py, sin tocar la caché del sitio ni publicar avisos en Redis.
+
+    python manage.py bench_feed --sizes 10000 100000
+"""
+import json
+import time
+import tracemalloc
+from datetime import date, datetime, time as dtime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.http import JsonResponse
+
+from citas.feed import calendar_events, stream_json_array
+from citas.models import Appointment, Service, appointment_end_time
+
+from ._bench import bench_environment
+
+
+def _legacy_response(start, end):
+    """Como el serializador anterior: modelos completos, lista en memoria, JsonResponse."""
+    events = []
+    qs = (
+        Appointment.objects.filter(date__range=(start, end))
+        .select_related("service", "resource").order_by("date", "time")
+    )
+    for ap in qs:
+        color = getattr(ap.service, "color", "#0d6efd") if getattr(ap, "service", None) else "#0d6efd"
+        events.append({
+            "id": f"appointment-{ap.pk}",  # mismo formato que el feed actual
+            "title": f"{ap.customer_name} - {ap.service.name if getattr(ap, 'service', None) else ''}",
+            "start": datetime.combine(ap.date, ap.time).isoformat(),
+            "end": datetime.combine(ap.date, ap.end_time).isoformat(),
+            "color": color,
+            "resource": ap.resource.name if ap.resource_id else None,
+        })
+    return JsonResponse(events, safe=False).content
+
+
+def _streamed(start, end, sink):
+    size = 0
+    for chunk in stream_json_array(calendar_events(start, end)):
+        data = chunk.encode()
+        size += len(data)
+        sink.append(data)
+    return size
+
+
+def _measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+class Command(BaseCommand):
+    help = "Compara memoria pico y tiempo del feed del calendario (lista vs streaming)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+
+    def handle(self, *args, **options):
+        with bench_environment():
+            self._bench(options)
+
+    def _bench(self, options):
+        service = Service.objects.create(name="Corte", duration_minutes=30)
+        start = date(2030, 1, 1)
+        self.stdout.write(f"{'citas':>8} {'':<10} {'seg':>7} {'pico MB':>8} {'bytes':>12}")
+        for n in options["sizes"]:
+            self._fill(service, start, n)
+            end = start + timedelta(days=364)
+
+            legacy, t_legacy, m_legacy = _measure(lambda: _legacy_response(start, end))
+            # El streaming se mide descartando cada trozo (como hace el servidor
+            # al escribir al socket); la salida se revisa aparte.
+            size, t_stream, m_stream = _measure(lambda: _streamed(start, end, _Discard()))
+            chunks = []
+            _streamed(start, end, chunks)
+            streamed = b"".join(chunks)
+            events = json.loads(streamed)
+            same = JsonResponse(events, safe=False).content == streamed and len(events) == n
+
+            self.stdout.write(f"{n:>8} {'lista':<10} {t_legacy:>7.2f} {m_legacy / 2**20:>8.1f} {len(legacy):>12}")
+            self.stdout.write(f"{'':>8} {'streaming':<10} {t_stream:>7.2f} {m_stream / 2**20:>8.1f} {size:>12}")
+            self.stdout.write(f"{'':>8} igual a JsonResponse: {'sí' if same else 'NO'}")
+
+    def _fill(self, service, start, n):
+        Appointment.objects.all().delete()
+        per_day = max(1, n // 365 + 1)
+        batch = []
+        for i in range(n):
+            day = start + timedelta(days=i // per_day)
+            minute = (i % per_day) * 5  # horas distintas dentro del día: mismo orden en ambos
+            t = dtime(minute // 60, minute % 60)
+            batch.append(Appointment(
+                customer_name=f"Clienta {i}", customer_phone="88888888", service=service,
+                date=day, time=t, duration_minutes=30, end_time=appointment_end_time(t, 30),
+            ))
+            if len(batch) == 5000:
+                Appointment.objects.bulk_create(batch)
+                batch = []
+        Appointment.objects.bulk_create(batch)
+
+
+class _Discard:
+    def append(self, _data):
+        pass
@@ -0,0 +1,88 @@
+# citas/management/commands/bench_home.py
+"""
+Tiempo de la home (la página y sus secciones, home_section) con las
+secciones sin cachear (cada request las vuelve a renderizar, como antes)
+contra las secciones ya en la caché ({% cache %}, citas/fragments.py). El
+formulario de reserva se renderiza siempre (tiene el token CSRF y los
+errores del POST). La caché de página completa para anónimos
+(citas/pagecache.py) queda afuera: con ella, las dos mediciones serían la
+misma respuesta guardada.
+
+Los datos y la caché son los desechables de _bench.py.
+
+    python manage.py bench_home --services 60 --testimonials 12 --requests 200
+"""
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from citas.catalog import catalog
+from citas.fragments import SECTIONS, invalidate_fragment
+from citas.models import Package, Service, ServiceCategory, Testimonial
+from citas.views import HOME_SECTIONS, home, home_section
+
+from ._bench import bench_environment
+
+
+class Command(BaseCommand):
+    help = "Compara el tiempo de render de la home con y sin secciones cacheadas."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--services", type=int, default=60)
+        parser.add_argument("--packages", type=int, default=12)
+        parser.add_argument("--testimonials", type=int, default=12)
+        parser.add_argument("--requests", type=int, default=200)
+
+    def handle(self, *args, **options):
+        with bench_environment():
+            self._bench(options)
+
+    def _bench(self, options):
+        self._fill(options)
+        factory = RequestFactory()
+        page = home.__wrapped__  # la vista, sin middleware ni caché de página
+
+        def get():
+            page(factory.get("/"))
+            for name in HOME_SECTIONS:
+                home_section(factory.get(f"/secciones/{name}/"), name)
+
+        n = options["requests"]
+        cache.clear()
+        catalog.get()
+
+        def uncached():
+            # Versión nueva en cada request: todas las secciones se renderizan
+            for section in SECTIONS:
+                invalidate_fragment(section)
+            get()
+
+        cold = self._time(uncached, n)
+        get()
+        warm = self._time(get, n)
+
+        self.stdout.write(f"{'':<22} {'ms/request':>10}")
+        self.stdout.write(f"{'secciones sin caché':<22} {cold * 1000 / n:>10.2f}")
+        self.stdout.write(f"{'secciones en caché':<22} {warm * 1000 / n:>10.2f}")
+
+    def _time(self, fn, n):
+        started = time.perf_counter()
+        for _ in range(n):
+            fn()
+        return time.perf_counter() - started
+
+    def _fill(self, options):
+        categories = [ServiceCategory.objects.create(name=f"Categoría {i}") for i in range(5)]
+        Service.objects.bulk_create(
+            Service(name=f"Servicio {i}", category=categories[i % len(categories)])
+            for i in range(options["services"])
+        )
+        Package.objects.bulk_create(
+            Package(title=f"Paquete {i}", price=15000 + i * 1000) for i in range(options["packages"])
+        )
+        Testimonial.objects.bulk_create(
+            Testimonial(name=f"Clienta {i}", comment="Excelente atención " * 8)
+            for i in range(options["testimonials"])
+        )
@@ -0,0 +1,114 @@
+# citas/management/commands/bench_images.py
+"""
+Bytes de imagen que baja la home: las fotos originales (como se subían antes)
+contra la versión que elige el navegador del srcset (citas/images.py), para
+un celular y una compu. También el tiempo del guardado (lo que espera el
+admin) y el de generar las versiones (lo que hace el worker, citas/jobs.py).
+
+Sube fotos generadas del tamaño de una cámara de celular al entorno de
+_bench.py: carpeta temporal en disco (aunque el sitio use Cloudinary), base
+de datos y caché desechables.
+
+    python manage.py bench_images --packages 6 --photos 6 --size 4032x3024
+"""
+import time
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from citas import jobs
+from citas.models import BeforeAfter, HomeBackground, Package, Testimonial
+
+from ._bench import bench_environment
+
+# pantalla -> (ancho en px CSS, densidad de píxeles)
+SCREENS = {"celular": (390, 3), "compu": (1440, 1)}
+
+# lugar de la foto -> ancho que ocupa según la pantalla (el `sizes` del template)
+SLOTS = {
+    "paquete": {"celular": 1.0, "compu": 1 / 3},
+    "antes/después": {"celular": 1.0, "compu": 1 / 2},
+}
+
+
+def _camera_photo(size):
+    """JPEG con degradé y ruido (comprime parecido a una foto real) y EXIF de celular."""
+    base = Image.radial_gradient("L").resize(size)
+    channels = [Image.blend(base, Image.effect_noise(size, 60), 0.25 + i * 0.1) for i in range(3)]
+    exif = Image.Exif()
+    exif[0x0112] = 1
+    exif[0x0110] = "Telefono X"
+    buf = BytesIO()
+    Image.merge("RGB", channels).save(buf, "JPEG", quality=92, exif=exif.tobytes())
+    return buf.getvalue()
+
+
+def _pick(variants, needed):
+    """Lo que hace el navegador con un srcset por ancho: el menor que alcanza."""
+    for width, name in variants:
+        if width >= needed:
+            return name
+    return variants[-1][1]
+
+
+class Command(BaseCommand):
+    help = "Compara los bytes de imagen de la home con originales y con versiones livianas."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--packages", type=int, default=6)
+        parser.add_argument("--photos", type=int, default=6, help="fotos de antes/después")
+        parser.add_argument("--size", default="4032x3024")
+
+    def handle(self, *args, **options):
+        size = tuple(int(v) for v in options["size"].split("x"))
+        with bench_environment(media=True):
+            self._run(options, size)
+
+    def _run(self, options, size):
+        raw = _camera_photo(size)
+        upload = lambda name: SimpleUploadedFile(name, raw, content_type="image/jpeg")
+
+        started = time.perf_counter()
+        HomeBackground.objects.create(image=upload("fondo.jpg"))
+        for i in range(options["packages"]):
+            Package.objects.create(title=f"Paquete {i}", image=upload(f"paquete{i}.jpg"))
+        testimonial = Testimonial.objects.create(name="Clienta", comment="Excelente")
+        for i in range(options["photos"] // 2):
+            BeforeAfter.objects.create(
+                testimonial=testimonial, before_image=upload(f"antes{i}.jpg"), after_image=upload(f"despues{i}.jpg")
+            )
+        saving = time.perf_counter() - started
+        started = time.perf_counter()
+        jobs.run_pending()
+        worker = time.perf_counter() - started
+
+        background = HomeBackground.objects.get()
+        items = [("fondo", background.image, background.image_variants)]
+        items += [("paquete", pkg.image, pkg.image_variants) for pkg in Package.objects.all()]
+        for photo in BeforeAfter.objects.all():
+            items.append(("antes/después", photo.before_image, photo.before_variants))
+            items.append(("antes/después", photo.after_image, photo.after_variants))
+
+        storage = background.image.storage
+        original = sum(field.size for _, field, _ in items)
+        self.stdout.write(f"{len(items)} fotos de {size[0]}x{size[1]} ({len(raw) / 1024:.0f} KB c/u)")
+        self.stdout.write(f"guardado (admin): {saving * 1000 / len(items):.0f} ms por foto")
+        self.stdout.write(f"versiones (worker): {worker * 1000 / len(items):.0f} ms por foto")
+        self.stdout.write(f"{'':<10} {'originales':>12} {'WebP':>12} {'JPEG':>12}")
+        for screen, (css_width, dpr) in SCREENS.items():
+            picked = {"webp": 0, "jpeg": 0}
+            for slot, _, data in items:
+                for fmt in picked:
+                    if slot == "fondo":
+                        # image-set() en CSS: el WebP más grande, o el JPEG de respaldo
+                        name = data["webp"][-1][1] if fmt == "webp" else data["jpeg"][len(data["jpeg"]) // 2][1]
+                    else:
+                        needed = css_width * SLOTS[slot][screen] * dpr
+                        name = _pick(data[fmt], needed)
+                    picked[fmt] += storage.size(name)
+            self.stdout.write(
+                f"{screen:<10} {original / 1024:>9.0f} KB {picked['webp'] / 1024:>9.0f} KB "
+                f"{picked['jpeg'] / 1024:>9.0f} KB"
+            )
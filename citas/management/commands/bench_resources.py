@@ -0,0 +1,127 @@
+# citas/management/commands/bench_resources.py
+"""
+Disponibilidad con varias estilistas / sillas: huecos por recurso (barrido de
+intervalos, citas/resources.py) contra el bucle ingenuo recurso × hora con
+any() sobre las citas de cada recurso.
+
+Carga N recursos y un mes de citas casi sin huecos en el entorno desechable
+de los benchmarks (_bench.py) y mide cuánto cuesta "¿qué horas tienen alguna
+estilista libre para el servicio X?" por día.
+
+    python manage.py bench_resources --resources 5 --days 30
+"""
+import random
+from datetime import date, timedelta
+from timeit import timeit
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from citas.availability import load_schedules, to_minutes, to_time
+from citas.hours import slot_template
+from citas.models import Appointment, Resource, Service, appointment_end_time
+from citas.resources import resources
+
+from ._bench import bench_environment
+
+
+def _naive_free_starts(starts, limits, by_resource, eligible, duration):
+    """Cada hora contra cada recurso, recorriendo sus citas."""
+    free = []
+    for s, limit in zip(starts, limits):
+        if s + duration > limit:
+            continue
+        for res in eligible:
+            load = sum(1 for a, b in by_resource.get(res.id, ()) if a < s + duration and b > s)
+            if load < res.capacity:
+                free.append(s)
+                break
+    return free
+
+
+class Command(BaseCommand):
+    help = "Compara la disponibilidad por recurso (barrido) con el bucle recurso × hora."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--resources", type=int, default=5)
+        parser.add_argument("--days", type=int, default=30)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        with bench_environment():
+            self._bench(options["resources"], options["days"], options["repeat"])
+
+    def _bench(self, n_resources, n_days, repeat):
+        rnd = random.Random(1)
+        corte = Service.objects.create(name="Corte", duration_minutes=45)
+        tinte = Service.objects.create(name="Tinte", duration_minutes=120)
+        res_objs = [Resource.objects.create(name=f"Estilista {i + 1}") for i in range(n_resources)]
+        # La mitad solo hace cortes
+        for res in res_objs[: n_resources // 2]:
+            res.services.add(corte)
+
+        first_day = date(2030, 1, 7)  # lunes
+        days = [first_day + timedelta(days=i) for i in range(n_days)]
+        appts = []
+        for day in days:
+            tpl = slot_template(day, 15)
+            if not tpl.starts:
+                continue
+            for res in res_objs:
+                # Citas seguidas con huecos cortos: ~85% del día ocupado
+                minute = tpl.starts[0]
+                close = max(tpl.limits)
+                while True:
+                    length = rnd.choice((30, 45, 60, 90, 120))
+                    if minute + length > close:
+                        break
+                    start = to_time(minute)
+                    appts.append(Appointment(
+                        customer_name="Bench", customer_phone="88888888",
+                        service=corte, resource=res, date=day, time=start,
+                        duration_minutes=length, end_time=appointment_end_time(start, length),
+                    ))
+                    minute += length + rnd.choice((0, 0, 0, 15, 30))
+        Appointment.objects.bulk_create(appts, batch_size=1000)
+        cache.clear()
+
+        loaded = load_schedules(days[0], days[-1])
+        resource_set = resources.get()
+        by_day = {}
+        for day, t, et, rid in Appointment.objects.values_list("date", "time", "end_time", "resource_id"):
+            by_day.setdefault(day, {}).setdefault(rid, []).append((to_minutes(t), to_minutes(et)))
+
+        self.stdout.write(
+            f"{n_resources} recursos, {len(days)} días, {len(appts)} citas "
+            f"({repeat} repeticiones, ms por mes completo)\n"
+        )
+        self.stdout.write(f"{'servicio':<8} {'paso':>5} {'barrido':>9} {'con huecos':>11} {'recurso×hora':>13} {'horas libres':>13}")
+
+        for service in (corte, tinte):
+            eligible = resource_set.eligible(service.pk)
+            for step in (60, 15):
+                def engine(cold=True):
+                    total = 0
+                    for day in days:
+                        sched = loaded[day]
+                        if cold:
+                            sched._gaps.clear()  # huecos recalculados (día recién leído de la caché)
+                        total += len(sched.free_starts(service.duration_minutes, step, service.pk))
+                    return total
+
+                def naive():
+                    total = 0
+                    for day in days:
+                        tpl = slot_template(day, step)
+                        total += len(_naive_free_starts(
+                            tpl.starts, tpl.limits, by_day.get(day, {}), eligible, service.duration_minutes,
+                        ))
+                    return total
+
+                assert engine() == naive()
+                t_engine = timeit(engine, number=repeat) / repeat * 1e3
+                t_warm = timeit(lambda: engine(cold=False), number=repeat) / repeat * 1e3
+                t_naive = timeit(naive, number=repeat) / repeat * 1e3
+                self.stdout.write(
+                    f"{service.name:<8} {step:>4}m {t_engine:>9.2f} {t_warm:>11.2f} {t_naive:>13.2f} {engine():>13}"
+                )
@@ -0,0 +1,26 @@
+# citas/management/commands/prune_schedule_changes.py
+"""
+Borra el registro de cambios de la agenda (sincronización incremental) más
+viejo que N días. Un cliente con un token anterior recibe "reset" y recarga
+el feed completo.
+
+    python manage.py prune_schedule_changes --days 30
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from citas.models import ScheduleChange
+
+
+class Command(BaseCommand):
+    help = "Borra cambios de agenda más viejos que --days (por defecto 30)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=30)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        deleted, _ = ScheduleChange.objects.filter(created_at__lt=cutoff).delete()
+        self.stdout.write(f"Cambios borrados: {deleted}")
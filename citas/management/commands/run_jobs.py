@@ -0,0 +1,105 @@
+# citas/management/commands/run_jobs.py
+"""
+Worker de la cola de trabajos (citas/jobs.py): toma lo pendiente y lo corre
+en un pool de hilos. Proceso aparte del web (línea `worker:` del Procfile).
+
+    python manage.py run_jobs --threads 4 --poll 2
+    python manage.py run_jobs --once    # vacía la cola y termina (cron)
+
+Con SIGTERM/Ctrl+C deja de tomar trabajos y espera a que terminen los que
+están corriendo. Una vez por hora borra los terminados hace más de
+--keep-days días.
+
+Algunas tareas guardan modelos y las señales cambian versiones en la caché
+(catálogo, secciones de la home). Con la caché en memoria del proceso
+(LocMemCache, sin REDIS_URL) esos cambios no le llegarían al web: el worker
+avisa y corre solo las tareas que no tocan la caché (WhatsApp, borrar
+archivos); las demás esperan a que haya REDIS_URL. --allow-local-cache las
+corre igual (desarrollo, o un solo proceso).
+"""
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from citas import jobs
+
+PRUNE_EVERY = 60 * 60
+LOCAL_CACHE = "django.core.cache.backends.locmem.LocMemCache"
+
+
+def _run_in_thread(job):
+    try:
+        return jobs.run(job)
+    finally:
+        # Cada hilo abre su propia conexión; que no quede colgada
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "Corre los trabajos en segundo plano (fotos, WhatsApp)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=4)
+        parser.add_argument("--poll", type=float, default=2.0, help="segundos entre consultas sin trabajo")
+        parser.add_argument("--once", action="store_true", help="terminar cuando no quede nada listo")
+        parser.add_argument("--keep-days", type=int, default=7)
+        parser.add_argument(
+            "--allow-local-cache", action="store_true",
+            help="correr aunque la caché sea la memoria de este proceso (desarrollo)",
+        )
+
+    def handle(self, *args, **options):
+        self.tasks = None
+        if settings.CACHES["default"]["BACKEND"] == LOCAL_CACHE and not options["allow_local_cache"]:
+            self.tasks = jobs.cache_free_tasks()
+            self.stderr.write(
+                "La caché es la memoria de cada proceso (LocMemCache): lo que invalide el worker "
+                "no lo vería el web. Solo corren " + ", ".join(self.tasks) + "; las versiones de "
+                "las fotos esperan. Definí REDIS_URL (o usá --allow-local-cache en desarrollo)."
+            )
+        self.stopping = False
+        previous = {sig: signal.signal(sig, self._stop) for sig in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            done, failed = self._loop(options)
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+        self.stdout.write(f"Trabajos: {done} bien, {failed} con error")
+
+    def _loop(self, options):
+        threads = max(1, options["threads"])
+        done = failed = 0
+        pruned_at = None
+        in_flight = set()
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="job") as pool:
+            while not self.stopping:
+                if not options["once"] and (pruned_at is None or time.monotonic() - pruned_at > PRUNE_EVERY):
+                    jobs.prune(options["keep_days"])
+                    pruned_at = time.monotonic()
+
+                free = threads - len(in_flight)
+                claimed = jobs.claim(free, self.tasks) if free > 0 else []
+                in_flight.update(pool.submit(_run_in_thread, job) for job in claimed)
+                if not in_flight:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll"])
+                    continue
+
+                # Espera a que se libere un hilo (o al próximo poll, por los
+                # reintentos y lo que encolen otros procesos)
+                finished, in_flight = wait(in_flight, timeout=options["poll"], return_when=FIRST_COMPLETED)
+                for future in finished:
+                    if future.result():
+                        done += 1
+                    else:
+                        failed += 1
+            # Al salir del with se esperan los que siguen corriendo
+        return done, failed
+
+    def _stop(self, signum, frame):
+        self.stopping = True
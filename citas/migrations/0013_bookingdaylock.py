@@ -0,0 +1,25 @@
+# Generated by Django 4.2.25 on 2026-10-17 22:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0012_package_vipcode_delete_promotion_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingDayLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Candado de reservas por día',
+                'verbose_name_plural': 'Candados de reservas por día',
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.25 on 2026-10-17 22:45
+
+from datetime import time
+
+from django.db import migrations, models
+
+
+def backfill_end_time(apps, schema_editor):
+    """Copia la duración actual del servicio a cada cita y calcula su hora de fin."""
+    Appointment = apps.get_model("citas", "Appointment")
+    batch = []
+    for ap in Appointment.objects.select_related("service").iterator(chunk_size=1000):
+        ap.duration_minutes = ap.service.duration_minutes if ap.service_id else 60
+        end = ap.time.hour * 60 + ap.time.minute + ap.duration_minutes
+        ap.end_time = time(end // 60, end % 60) if end < 24 * 60 else time(23, 59, 59)
+        batch.append(ap)
+        if len(batch) >= 1000:
+            Appointment.objects.bulk_update(batch, ["duration_minutes", "end_time"])
+            batch = []
+    if batch:
+        Appointment.objects.bulk_update(batch, ["duration_minutes", "end_time"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0013_bookingdaylock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='duration_minutes',
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='end_time',
+            field=models.TimeField(null=True),
+        ),
+        migrations.RunPython(backfill_end_time, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='appointment',
+            name='duration_minutes',
+            field=models.PositiveIntegerField(blank=True, help_text='Se copia del servicio al reservar. Dejalo vacío para volver a copiarla.', verbose_name='Duración (min)'),
+        ),
+        migrations.AlterField(
+            model_name='appointment',
+            name='end_time',
+            field=models.TimeField(editable=False, verbose_name='Fin'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['date', 'time', 'end_time'], name='appointment_date_time_end'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.25 on 2026-10-17 22:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0014_appointment_duration_end_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlockRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reason', models.CharField(blank=True, max_length=200, verbose_name='Motivo')),
+                ('weekdays', models.PositiveSmallIntegerField(default=127, verbose_name='Días de la semana')),
+                ('start_time', models.TimeField(blank=True, null=True, verbose_name='Inicio')),
+                ('end_time', models.TimeField(blank=True, null=True, verbose_name='Fin')),
+                ('valid_from', models.DateField(verbose_name='Desde')),
+                ('valid_until', models.DateField(blank=True, null=True, verbose_name='Hasta')),
+                ('active', models.BooleanField(default=True, verbose_name='Activa')),
+            ],
+            options={
+                'verbose_name': 'Bloqueo recurrente',
+                'verbose_name_plural': 'Bloqueos recurrentes',
+            },
+        ),
+        migrations.CreateModel(
+            name='BlockRuleException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Fecha')),
+                ('rule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exceptions', to='citas.blockrule')),
+            ],
+            options={
+                'verbose_name': 'Excepción',
+                'verbose_name_plural': 'Excepciones',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='blockruleexception',
+            constraint=models.UniqueConstraint(fields=('rule', 'date'), name='uniq_blockrule_exception_date'),
+        ),
+    ]
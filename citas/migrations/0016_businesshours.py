@@ -0,0 +1,39 @@
+# Generated by Django 4.2.25 on 2026-10-17 22:32
+
+from datetime import time
+
+from django.db import migrations, models
+
+
+def seed_default_hours(apps, schema_editor):
+    # Horario que estaba fijo en el código: lunes a sábado de 08:00 a 20:00
+    BusinessHours = apps.get_model("citas", "BusinessHours")
+    BusinessHours.objects.bulk_create(
+        BusinessHours(weekday=wd, open_time=time(8, 0), close_time=time(20, 0))
+        for wd in range(6)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0015_blockrule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BusinessHours',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Lunes'), (1, 'Martes'), (2, 'Miércoles'), (3, 'Jueves'), (4, 'Viernes'), (5, 'Sábado'), (6, 'Domingo')], verbose_name='Día')),
+                ('open_time', models.TimeField(verbose_name='Abre')),
+                ('close_time', models.TimeField(verbose_name='Cierra')),
+            ],
+            options={
+                'verbose_name': 'Horario de atención',
+                'verbose_name_plural': 'Horarios de atención',
+                'ordering': ('weekday', 'open_time'),
+            },
+        ),
+        migrations.RunPython(seed_default_hours, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.25 on 2026-10-17 22:36
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0016_businesshours'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Resource',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Nombre')),
+                ('kind', models.CharField(choices=[('stylist', 'Estilista'), ('chair', 'Silla')], default='stylist', max_length=10, verbose_name='Tipo')),
+                ('capacity', models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)], verbose_name='Citas a la vez')),
+                ('active', models.BooleanField(default=True, verbose_name='Activo')),
+                ('services', models.ManyToManyField(blank=True, help_text='Vacío = hace todos los servicios.', related_name='resources', to='citas.service', verbose_name='Servicios')),
+            ],
+            options={
+                'verbose_name': 'Estilista / silla',
+                'verbose_name_plural': 'Estilistas y sillas',
+                'ordering': ('name',),
+            },
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='resource',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='appointments', to='citas.resource', verbose_name='Estilista / silla'),
+        ),
+    ]
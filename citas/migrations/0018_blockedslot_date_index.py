@@ -0,0 +1,17 @@
+# Generated by Django 4.2.25 on 2026-10-17 22:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0017_resource'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blockedslot',
+            index=models.Index(fields=['date'], name='blockedslot_date'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.25 on 2026-10-17 22:39
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def create_version_row(apps, schema_editor):
+    apps.get_model("citas", "ScheduleVersion").objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0018_blockedslot_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('counter', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Versión de la agenda',
+                'verbose_name_plural': 'Versión de la agenda',
+            },
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.25 on 2026-10-17 22:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0019_scheduleversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('appointment', 'Cita'), ('block', 'Bloqueo'), ('reset', 'Recargar todo')], max_length=12)),
+                ('object_id', models.BigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Cambio de agenda',
+                'verbose_name_plural': 'Cambios de agenda',
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.25 on 2026-10-17 22:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0020_schedulechange'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='testimonial',
+            index=models.Index(condition=models.Q(('active', True)), fields=['-created_at', '-id'], name='testimonial_feed'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.25 on 2026-10-17 23:15
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def number_existing_changes(apps, schema_editor):
+    # Los tokens que ya tienen los clientes son ids: se conservan como seq
+    ScheduleChange = apps.get_model("citas", "ScheduleChange")
+    ScheduleChange.objects.update(seq=F("pk"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0023_job_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schedulechange',
+            name='seq',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True, unique=True),
+        ),
+        migrations.RunPython(number_existing_changes, migrations.RunPython.noop),
+    ]
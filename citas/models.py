@@ -6,7 +6,11 @@ Created on Tue Oct 28 21:31:45 2025
 """
 
 # salon/citas/models.py
+from datetime import time as dtime
+
+from django.core.validators import MinValueValidator
 from django.db import models
+from django.utils import timezone
 
 
 class ServiceCategory(models.Model):
@@ -42,6 +46,56 @@ class Service(models.Model):
         verbose_name_plural = "Servicios"
 
 
+class Resource(models.Model):
+    """
+    Estilista o silla: cada cita ocupa un recurso. `capacity` es cuántas citas
+    puede atender a la vez (una estilista = 1). Sin servicios marcados, el
+    recurso hace todos.
+    """
+    KINDS = (
+        ("stylist", "Estilista"),
+        ("chair", "Silla"),
+    )
+
+    name = models.CharField("Nombre", max_length=100, unique=True)
+    kind = models.CharField("Tipo", max_length=10, choices=KINDS, default="stylist")
+    capacity = models.PositiveSmallIntegerField(
+        "Citas a la vez",
+        default=1,
+        validators=[MinValueValidator(1)],
+    )
+    services = models.ManyToManyField(
+        Service,
+        blank=True,
+        related_name="resources",
+        verbose_name="Servicios",
+        help_text="Vacío = hace todos los servicios.",
+    )
+    active = models.BooleanField("Activo", default=True)
+
+    class Meta:
+        verbose_name = "Estilista / silla"
+        verbose_name_plural = "Estilistas y sillas"
+        ordering = ("name",)
+
+    def __str__(self):
+        return self.name
+
+
+def appointment_end_time(start, minutes):
+    """Hora de fin de una cita; si pasaría de medianoche se corta en 23:59:59."""
+    end = start.hour * 60 + start.minute + minutes
+    if end >= 24 * 60:
+        return dtime(23, 59, 59)
+    return dtime(end // 60, end % 60)
+
+
+class AppointmentQuerySet(models.QuerySet):
+    def overlapping(self, date, start, end):
+        """Citas de `date` que se cruzan con [start, end) (usa el índice date/time/end_time)."""
+        return self.filter(date=date, time__lt=end, end_time__gt=start)
+
+
 class Appointment(models.Model):
     customer_name = models.CharField(max_length=100)
     customer_phone = models.CharField(max_length=20)
@@ -51,15 +105,47 @@ class Appointment(models.Model):
         blank=True,
         on_delete=models.SET_NULL,
     )
+    # Vacío = la cita ocupa todo el salón (así quedan las citas de antes de
+    # cargar estilistas); las reservas web eligen un recurso libre.
+    resource = models.ForeignKey(
+        Resource,
+        null=True,
+        blank=True,
+        on_delete=models.PROTECT,
+        related_name="appointments",
+        verbose_name="Estilista / silla",
+    )
     date = models.DateField()
     time = models.TimeField()
+    # Copia de la duración al reservar: si luego se edita el servicio,
+    # las citas ya hechas no cambian de largo.
+    duration_minutes = models.PositiveIntegerField(
+        "Duración (min)",
+        blank=True,
+        help_text="Se copia del servicio al reservar. Dejalo vacío para volver a copiarla.",
+    )
+    end_time = models.TimeField("Fin", editable=False)
+
+    objects = AppointmentQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.customer_name} - {self.service} ({self.date} {self.time})"
 
+    def save(self, *args, **kwargs):
+        if self.duration_minutes is None:
+            self.duration_minutes = self.service.duration_minutes if self.service_id else 60
+        self.end_time = appointment_end_time(self.time, self.duration_minutes)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"time", "duration_minutes"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "duration_minutes", "end_time"}
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = "Cita"
         verbose_name_plural = "Citas"
+        indexes = [
+            models.Index(fields=["date", "time", "end_time"], name="appointment_date_time_end"),
+        ]
 
 
 class BlockedSlot(models.Model):
@@ -79,6 +165,104 @@ class BlockedSlot(models.Model):
     class Meta:
         verbose_name = "Auto bloqueo"
         verbose_name_plural = "Auto bloqueos"
+        indexes = [
+            models.Index(fields=["date"], name="blockedslot_date"),
+        ]
+
+
+class BusinessHours(models.Model):
+    """
+    Horario de atención por día de la semana. Varias filas el mismo día =
+    turno partido (p. ej. 08:00-12:00 y 14:00-20:00). Un día sin filas está
+    cerrado.
+    """
+    weekday = models.PositiveSmallIntegerField(
+        "Día",
+        choices=(
+            (0, "Lunes"),
+            (1, "Martes"),
+            (2, "Miércoles"),
+            (3, "Jueves"),
+            (4, "Viernes"),
+            (5, "Sábado"),
+            (6, "Domingo"),
+        ),
+    )
+    open_time = models.TimeField("Abre")
+    close_time = models.TimeField("Cierra")
+
+    class Meta:
+        verbose_name = "Horario de atención"
+        verbose_name_plural = "Horarios de atención"
+        ordering = ("weekday", "open_time")
+
+    def __str__(self):
+        return (
+            f"{self.get_weekday_display()} "
+            f"{self.open_time:%H:%M}-{self.close_time:%H:%M}"
+        )
+
+
+class BlockRule(models.Model):
+    """
+    Bloqueo que se repite cada semana (p. ej. "lunes 12:00-14:00" o
+    "vacaciones": todos los días, sin horas, entre dos fechas), sin tener que
+    crear un BlockedSlot por fecha. Sin horas = día completo.
+    """
+    # Bits de `weekdays`: lunes=1, martes=2, miércoles=4, ... domingo=64
+    WEEKDAYS = BusinessHours._meta.get_field("weekday").choices
+
+    reason = models.CharField("Motivo", max_length=200, blank=True)
+    weekdays = models.PositiveSmallIntegerField("Días de la semana", default=0b1111111)
+    start_time = models.TimeField("Inicio", blank=True, null=True)
+    end_time = models.TimeField("Fin", blank=True, null=True)
+    valid_from = models.DateField("Desde")
+    valid_until = models.DateField("Hasta", blank=True, null=True)
+    active = models.BooleanField("Activa", default=True)
+
+    class Meta:
+        verbose_name = "Bloqueo recurrente"
+        verbose_name_plural = "Bloqueos recurrentes"
+
+    def weekday_names(self):
+        return ", ".join(name for wd, name in self.WEEKDAYS if self.weekdays & (1 << wd))
+
+    def __str__(self):
+        hours = f"{self.start_time}-{self.end_time}" if self.start_time else "todo el día"
+        return f"{self.weekday_names()} {hours} - {self.reason}"
+
+
+class BlockRuleException(models.Model):
+    """Fecha en la que una regla recurrente NO aplica (p. ej. un feriado trabajado)."""
+    rule = models.ForeignKey(BlockRule, on_delete=models.CASCADE, related_name="exceptions")
+    date = models.DateField("Fecha")
+
+    class Meta:
+        verbose_name = "Excepción"
+        verbose_name_plural = "Excepciones"
+        constraints = [
+            models.UniqueConstraint(fields=("rule", "date"), name="uniq_blockrule_exception_date"),
+        ]
+
+    def __str__(self):
+        return f"Excepción {self.date}"
+
+
+class BookingDayLock(models.Model):
+    """
+    Una fila por fecha con reservas. Mientras se valida y guarda una cita se
+    toma el candado de la fila de su fecha (ver citas/booking.py), así dos
+    reservas simultáneas del mismo día se hacen una detrás de la otra.
+    """
+    date = models.DateField(unique=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Candado de reservas por día"
+        verbose_name_plural = "Candados de reservas por día"
+
+    def __str__(self):
+        return f"Candado {self.date}"
 
 
 class Testimonial(models.Model):
@@ -90,6 +274,18 @@ class Testimonial(models.Model):
     def __str__(self):
         return f"{self.name}"
 
+    class Meta:
+        indexes = [
+            # Paginación por cursor de /api/testimonios/ (más nuevos primero).
+            # "active" va como condición del índice: SQLite no usa una columna
+            # booleana al principio del índice para un WHERE "active".
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=models.Q(active=True),
+                name="testimonial_feed",
+            ),
+        ]
+
 
 class BeforeAfter(models.Model):
     testimonial = models.ForeignKey(
@@ -100,6 +296,9 @@ class BeforeAfter(models.Model):
     before_image = models.ImageField(upload_to="before_after/")
     after_image = models.ImageField(upload_to="before_after/")
     caption = models.CharField(max_length=200, blank=True)
+    # Versiones livianas de cada foto (citas/images.py)
+    before_variants = models.JSONField(default=dict, blank=True, editable=False)
+    after_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return f"Before/After de {self.testimonial.name}"
@@ -111,6 +310,7 @@ class HomeBackground(models.Model):
     Solo necesitarás 1 registro activo normalmente.
     """
     image = models.ImageField(upload_to="home_backgrounds/")
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)  # citas/images.py
     active = models.BooleanField(default=True)
 
     class Meta:
@@ -148,6 +348,7 @@ class Package(models.Model):
     title = models.CharField("Título", max_length=150)
     description = models.TextField("Descripción", blank=True)
     image = models.ImageField(upload_to="packages/", blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)  # citas/images.py
 
     price = models.PositiveIntegerField("Precio (CRC)", blank=True, null=True)
     show_price = models.BooleanField(
@@ -171,4 +372,97 @@ class Package(models.Model):
 
     def __str__(self):
         scope = "VIP" if self.vip_only else "Público"
-        return f"{self.title} ({scope})"
\ No newline at end of file
+        return f"{self.title} ({scope})"
+
+
+class ScheduleVersion(models.Model):
+    """
+    Contador de cambios de la agenda (una sola fila). Sube con cada cambio en
+    citas, bloqueos, servicios u horarios; las APIs JSON lo usan como ETag
+    (ver citas/versions.py). La caché guarda una copia; esta fila es la
+    fuente de verdad si la caché se pierde.
+    """
+    counter = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Versión de la agenda"
+        verbose_name_plural = "Versión de la agenda"
+
+    def __str__(self):
+        return f"Agenda v{self.counter}"
+
+
+class ScheduleChange(models.Model):
+    """
+    Registro de cambios de la agenda para la sincronización incremental
+    (/api/appointments/changes/). Cada alta, edición o baja de una cita o un
+    bloqueo deja una fila; `seq` (orden de commit, ver citas/changes.py) es
+    el token que guarda el cliente. Si se borró el objeto, la fila hace de
+    lápida. Un cambio que afecta a todos los eventos (servicio, regla,
+    recurso) se anota como "reset".
+    """
+    APPOINTMENT = "appointment"
+    BLOCK = "block"
+    RESET = "reset"
+    KINDS = (
+        (APPOINTMENT, "Cita"),
+        (BLOCK, "Bloqueo"),
+        (RESET, "Recargar todo"),
+    )
+
+    kind = models.CharField(max_length=12, choices=KINDS)
+    object_id = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Se asigna al confirmarse la transacción; None mientras tanto
+    seq = models.PositiveBigIntegerField(null=True, blank=True, unique=True, editable=False)
+
+    class Meta:
+        verbose_name = "Cambio de agenda"
+        verbose_name_plural = "Cambios de agenda"
+
+    def __str__(self):
+        return f"#{self.pk} {self.kind} {self.object_id or ''}"
+
+
+class Job(models.Model):
+    """
+    Trabajo lento (fotos, WhatsApp) que corre fuera del request, en el worker
+    `manage.py run_jobs` (citas/jobs.py). `task` es el nombre registrado con
+    @task; `kwargs`, sus argumentos en JSON.
+    """
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = (
+        (PENDING, "Pendiente"),
+        (RUNNING, "En curso"),
+        (DONE, "Hecho"),
+        (FAILED, "Falló"),
+    )
+
+    task = models.CharField(max_length=100)
+    # Identifica "lo mismo" (p. ej. las fotos de un paquete): no se encola
+    # dos veces mientras haya uno pendiente, ni corren dos a la vez
+    key = models.CharField(max_length=200, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Trabajo en segundo plano"
+        verbose_name_plural = "Trabajos en segundo plano"
+        indexes = [
+            # Lo que consulta el worker en cada vuelta
+            models.Index(fields=["status", "run_after"], name="job_queue"),
+            models.Index(fields=["key", "status"], name="job_key"),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.task} ({self.status})"
@@ -0,0 +1,76 @@
+# salon/citas/pagecache.py
+"""
+Caché de la página completa para visitas anónimas (GET /, /servicios/,
+/testimonios/).
+
+Para quien no tiene sesión el HTML es el mismo salvo el token CSRF de los
+formularios. La primera visita renderiza normal y se guarda el HTML con el
+valor del token reemplazado por un marcador; las siguientes sirven esa
+copia poniendo un token nuevo para cada request, sin ORM ni templates.
+
+La clave lleva la versión del contenido de cada página (catálogo, sección
+de testimonios...): cuando las señales la cambian, la copia vieja deja de
+usarse y vence sola.
+"""
+import re
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+KEY_PREFIX = "citas:page"
+TIMEOUT = 60 * 60 * 24
+
+CSRF_PLACEHOLDER = "__csrf-token__"
+_CSRF_INPUT = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+def _cacheable_request(request):
+    # Con cookie de sesión puede ser alguien logueado (admin) o con mensajes
+    # pendientes: se renderiza siempre
+    return (
+        request.method in ("GET", "HEAD")
+        and not request.GET
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+    )
+
+
+def _cacheable_response(response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not response.has_header("Cache-Control")
+    )
+
+
+def anonymous_page_cache(name, version):
+    """
+    Decorador de vista: guarda la respuesta de una visita anónima bajo
+    `name` + version() y la reusa con un token CSRF propio de cada request.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if not _cacheable_request(request):
+                return view(request, *args, **kwargs)
+
+            key = f"{KEY_PREFIX}:{name}:{version()}"
+            cached = cache.get(key)
+            if cached is not None:
+                content_type, body = cached
+                # get_token() además hace que CsrfViewMiddleware mande la cookie
+                token = get_token(request).encode()
+                return HttpResponse(body.replace(CSRF_PLACEHOLDER.encode(), token), content_type=content_type)
+
+            response = view(request, *args, **kwargs)
+            if _cacheable_response(response):
+                body = _CSRF_INPUT.sub(rb"\g<1>" + CSRF_PLACEHOLDER.encode() + rb"\g<2>", response.content)
+                cache.set(key, (response["Content-Type"], body), TIMEOUT)
+            return response
+
+        return wrapped
+
+    return decorator
@@ -0,0 +1,131 @@
+# salon/citas/resources.py
+"""
+Estilistas / sillas (Resource) y huecos libres por recurso.
+
+Los recursos activos se compilan una vez por proceso (capacidad y servicios
+que hacen). Las citas de cada recurso se guardan como intervalos; un barrido
+por extremos ordenados da los tramos en los que el recurso está lleno
+(tantas citas como su capacidad) y, por complemento, sus huecos libres.
+
+"¿Hay alguna estilista libre a las 10:00 para el servicio X?" se responde con
+la unión de los huecos de los recursos que hacen X: O(citas · log citas) por
+recurso y día, sin probar cada par recurso × hora.
+"""
+from bisect import bisect_right
+from collections import namedtuple
+
+from .models import Resource
+from .snapshots import ProcessSnapshot
+
+MINUTES_PER_DAY = 24 * 60
+
+# services: frozenset de ids, o None si hace todos los servicios
+CompiledResource = namedtuple("CompiledResource", "id name capacity services")
+
+
+class ResourceSet:
+    """Recursos activos en el orden en que se asignan (por nombre)."""
+    __slots__ = ("resources", "_eligible")
+
+    def __init__(self, resources):
+        self.resources = tuple(resources)
+        self._eligible = {}
+
+    def __bool__(self):
+        return bool(self.resources)
+
+    def eligible(self, service_id=None):
+        """Recursos que pueden hacer el servicio (todos si no se indica)."""
+        if service_id is None:
+            return self.resources
+        found = self._eligible.get(service_id)
+        if found is None:
+            found = self._eligible[service_id] = tuple(
+                r for r in self.resources if r.services is None or service_id in r.services
+            )
+        return found
+
+
+def saturated(intervals, capacity):
+    """
+    Tramos [(inicio, fin), ...] ordenados y disjuntos en los que hay al menos
+    `capacity` intervalos a la vez. Barrido por extremos: un fin y un inicio
+    en el mismo minuto no se solapan.
+    """
+    events = sorted([(s, 1) for s, e in intervals if e > s] + [(e, -1) for s, e in intervals if e > s])
+    out = []
+    count = 0
+    opened = None
+    for t, delta in events:
+        count += delta
+        if delta > 0 and count == capacity:
+            opened = t
+        elif delta < 0 and count == capacity - 1 and t > opened:
+            if out and out[-1][1] == opened:
+                out[-1] = (out[-1][0], t)
+            else:
+                out.append((opened, t))
+    return out
+
+
+def peak_load(intervals):
+    """Máximo de intervalos simultáneos."""
+    load = peak = 0
+    for _t, delta in sorted([(s, 1) for s, e in intervals] + [(e, -1) for s, e in intervals]):
+        load += delta
+        peak = max(peak, load)
+    return peak
+
+
+class FreeGaps:
+    """Huecos libres [(inicio, fin), ...] de un recurso en un día."""
+    __slots__ = ("gaps", "_starts")
+
+    def __init__(self, busy):
+        gaps = []
+        prev = 0
+        for s, e in busy:
+            if s > prev:
+                gaps.append((prev, s))
+            prev = max(prev, e)
+        if prev < MINUTES_PER_DAY:
+            gaps.append((prev, MINUTES_PER_DAY))
+        self.gaps = gaps
+        self._starts = [g[0] for g in gaps]
+
+    def fits(self, start, end):
+        """True si [start, end) cae entero en un hueco (búsqueda binaria)."""
+        i = bisect_right(self._starts, start) - 1
+        return i >= 0 and self.gaps[i][1] >= end
+
+    def start_ranges(self, duration):
+        """[(primer_inicio, último_inicio), ...] donde cabe un servicio de `duration`."""
+        return [(a, b - duration) for a, b in self.gaps if b - a >= duration]
+
+
+def merge_ranges(ranges):
+    """Une rangos cerrados [(a, b), ...] (de varios recursos) en disjuntos y ordenados."""
+    merged = []
+    for a, b in sorted(ranges):
+        if merged and a <= merged[-1][1]:
+            if b > merged[-1][1]:
+                merged[-1] = (merged[-1][0], b)
+        else:
+            merged.append((a, b))
+    return merged
+
+
+def _build():
+    resources = []
+    for res in Resource.objects.filter(active=True).prefetch_related("services").order_by("name"):
+        service_ids = frozenset(s.pk for s in res.services.all())
+        resources.append(CompiledResource(
+            id=res.pk,
+            name=res.name,
+            capacity=max(res.capacity, 1),
+            services=service_ids or None,
+        ))
+    return ResourceSet(resources)
+
+
+resources = ProcessSnapshot("resources", _build)
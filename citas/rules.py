@@ -0,0 +1,87 @@
+# salon/citas/rules.py
+"""
+Evaluador de bloqueos recurrentes (BlockRule).
+
+Las reglas activas se compilan una vez por proceso en tuplas agrupadas por
+día de la semana; "¿qué está bloqueado el día D?" recorre solo las reglas de
+ese día de la semana, sin filas por fecha en la base de datos. Se reconstruye
+cuando una regla o excepción cambia (ver citas/signals.py).
+"""
+from collections import namedtuple
+from datetime import timedelta
+
+from .models import BlockRule
+from .snapshots import ProcessSnapshot
+
+FULL_DAY = None  # intervalo (FULL_DAY, FULL_DAY): día completo bloqueado
+
+CompiledRule = namedtuple(
+    "CompiledRule", "valid_from valid_until start end exceptions reason"
+)
+
+
+class BlockRuleSet:
+    """Reglas compiladas, indexadas por weekday() (0=lunes ... 6=domingo)."""
+    __slots__ = ("_by_weekday",)
+
+    def __init__(self, rules):
+        # rules: iterable de (máscara de días, CompiledRule)
+        by_weekday = [[] for _ in range(7)]
+        for mask, rule in rules:
+            for wd in range(7):
+                if mask & (1 << wd):
+                    by_weekday[wd].append(rule)
+        self._by_weekday = tuple(tuple(r) for r in by_weekday)
+
+    def __bool__(self):
+        return any(self._by_weekday)
+
+    def blocked_intervals(self, day):
+        """
+        [(inicio, fin, motivo), ...] en minutos desde las 00:00 para `day`.
+        Un bloqueo de día completo viene como (FULL_DAY, FULL_DAY, motivo).
+        """
+        out = []
+        for r in self._by_weekday[day.weekday()]:
+            if day < r.valid_from or (r.valid_until and day > r.valid_until):
+                continue
+            if day in r.exceptions:
+                continue
+            out.append((r.start, r.end, r.reason))
+        return out
+
+    def blocked_intervals_range(self, start_date, end_date):
+        """{fecha: [(inicio, fin, motivo), ...]} solo para los días con algo bloqueado."""
+        result = {}
+        day = start_date
+        while day <= end_date:
+            intervals = self.blocked_intervals(day)
+            if intervals:
+                result[day] = intervals
+            day += timedelta(days=1)
+        return result
+
+
+def _to_minutes(t):
+    return t.hour * 60 + t.minute
+
+
+def _build():
+    rules = []
+    for rule in BlockRule.objects.filter(active=True).prefetch_related("exceptions"):
+        if rule.start_time and rule.end_time:
+            start, end = _to_minutes(rule.start_time), _to_minutes(rule.end_time)
+        else:
+            start = end = FULL_DAY
+        rules.append((rule.weekdays, CompiledRule(
+            valid_from=rule.valid_from,
+            valid_until=rule.valid_until,
+            start=start,
+            end=end,
+            exceptions=frozenset(e.date for e in rule.exceptions.all()),
+            reason=rule.reason,
+        )))
+    return BlockRuleSet(rules)
+
+
+block_rules = ProcessSnapshot("block_rules", _build)
@@ -0,0 +1,229 @@
+# salon/citas/signals.py
+"""
+Invalidación de la caché de disponibilidad (citas/availability.py).
+Solo se borran las fechas afectadas por cada cambio. Editar un servicio no
+invalida nada: cada cita guarda su propia duración y hora de fin.
+Las reglas recurrentes cambian la versión de su snapshot (citas/rules.py),
+que forma parte de la clave de cada día cacheado. El horario de atención
+(citas/hours.py) no está en la ocupación cacheada: basta con reconstruir sus
+plantillas. Lo mismo con estilistas / sillas (citas/resources.py): la
+ocupación cacheada guarda las citas por id de recurso, no su configuración.
+El catálogo público (citas/catalog.py) se reconstruye cuando cambian
+servicios, categorías, paquetes o el fondo del inicio, y de las secciones
+cacheadas de home.html (citas/fragments.py) se descarta solo la afectada.
+Las fotos nuevas encolan sus versiones livianas (citas/images.py) para el
+worker (citas/jobs.py): el admin no espera a Pillow ni al storage.
+
+Además, cualquier cambio que se ve en las APIs JSON sube la versión de la
+agenda (citas/versions.py), que es su ETag, y queda anotado en el registro
+de cambios de la sincronización incremental (citas/changes.py). Ese mismo
+cambio se avisa en vivo al calendario del admin (citas/live.py).
+"""
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .availability import invalidate_dates_on_commit
+from .catalog import catalog
+from .fragments import invalidate_fragment
+from .images import variants_outdated
+from .jobs import enqueue
+from .hours import business_hours
+from .models import (
+    Appointment,
+    BeforeAfter,
+    BlockedSlot,
+    BlockRule,
+    BlockRuleException,
+    BusinessHours,
+    HomeBackground,
+    Package,
+    Resource,
+    ScheduleChange,
+    Service,
+    ServiceCategory,
+    Testimonial,
+)
+from .resources import resources
+from .rules import block_rules
+from .changes import record_change
+from .live import publish_on_commit
+from .versions import bump_on_commit
+
+
+# ---------- Citas y bloqueos ----------
+
+@receiver(pre_save, sender=Appointment)
+@receiver(pre_save, sender=BlockedSlot)
+def _remember_old_date(sender, instance, **kwargs):
+    # Si se mueve a otra fecha, también hay que liberar la fecha anterior
+    instance._old_date = None
+    if instance.pk:
+        instance._old_date = (
+            sender.objects.filter(pk=instance.pk).values_list("date", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_save, sender=BlockedSlot)
+def _schedule_saved(sender, instance, **kwargs):
+    invalidate_dates_on_commit([instance.date, getattr(instance, "_old_date", None)])
+
+
+@receiver(post_delete, sender=Appointment)
+@receiver(post_delete, sender=BlockedSlot)
+def _schedule_deleted(sender, instance, **kwargs):
+    invalidate_dates_on_commit([instance.date])
+
+
+# ---------- Bloqueos recurrentes ----------
+
+@receiver(post_save, sender=BlockRule)
+@receiver(post_delete, sender=BlockRule)
+@receiver(post_save, sender=BlockRuleException)
+@receiver(post_delete, sender=BlockRuleException)
+def _block_rules_changed(sender, **kwargs):
+    block_rules.invalidate()
+
+
+# ---------- Horario de atención ----------
+
+@receiver(post_save, sender=BusinessHours)
+@receiver(post_delete, sender=BusinessHours)
+def _business_hours_changed(sender, **kwargs):
+    business_hours.invalidate()
+
+
+# ---------- Estilistas / sillas ----------
+
+@receiver(post_save, sender=Resource)
+@receiver(post_delete, sender=Resource)
+@receiver(m2m_changed, sender=Resource.services.through)
+def _resources_changed(sender, **kwargs):
+    resources.invalidate()
+
+
+# ---------- Catálogo público ----------
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=ServiceCategory)
+@receiver(post_delete, sender=ServiceCategory)
+@receiver(post_save, sender=Package)
+@receiver(post_delete, sender=Package)
+@receiver(post_save, sender=HomeBackground)
+@receiver(post_delete, sender=HomeBackground)
+def _catalog_changed(sender, **kwargs):
+    catalog.invalidate()
+
+
+# ---------- Secciones cacheadas de home.html ----------
+
+_FRAGMENTS = {
+    Service: "services",
+    ServiceCategory: "services",
+    Package: "packages",
+    Testimonial: "testimonials",
+    BeforeAfter: "testimonials",
+    HomeBackground: "background",
+}
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=ServiceCategory)
+@receiver(post_delete, sender=ServiceCategory)
+@receiver(post_save, sender=Package)
+@receiver(post_delete, sender=Package)
+@receiver(post_save, sender=Testimonial)
+@receiver(post_delete, sender=Testimonial)
+@receiver(post_save, sender=BeforeAfter)
+@receiver(post_delete, sender=BeforeAfter)
+@receiver(post_save, sender=HomeBackground)
+@receiver(post_delete, sender=HomeBackground)
+def _fragment_changed(sender, **kwargs):
+    invalidate_fragment(_FRAGMENTS[sender])
+
+
+# ---------- Versiones livianas de las fotos ----------
+
+# modelo -> ((campo de imagen, JSONField de versiones), ...)
+_IMAGE_FIELDS = {
+    Package: (("image", "image_variants"),),
+    HomeBackground: (("image", "image_variants"),),
+    BeforeAfter: (("before_image", "before_variants"), ("after_image", "after_variants")),
+}
+
+
+@receiver(post_save, sender=Package)
+@receiver(post_save, sender=HomeBackground)
+@receiver(post_save, sender=BeforeAfter)
+def _refresh_image_variants(sender, instance, raw=False, **kwargs):
+    if raw:  # loaddata: los archivos pueden no existir todavía
+        return
+    for image_field, variants_field in _IMAGE_FIELDS[sender]:
+        if variants_outdated(getattr(instance, image_field), getattr(instance, variants_field)):
+            enqueue(
+                "images.refresh",
+                key=f"{sender._meta.label_lower}:{instance.pk}:{image_field}",
+                model=sender._meta.label,
+                pk=instance.pk,
+                image_field=image_field,
+                variants_field=variants_field,
+            )
+
+
+@receiver(post_delete, sender=Package)
+@receiver(post_delete, sender=HomeBackground)
+@receiver(post_delete, sender=BeforeAfter)
+def _delete_image_variants(sender, instance, **kwargs):
+    for image_field, variants_field in _IMAGE_FIELDS[sender]:
+        data = getattr(instance, variants_field)
+        if data:
+            enqueue("images.delete", model=sender._meta.label, image_field=image_field, data=data)
+
+
+# ---------- Versión de la agenda (ETag de las APIs) ----------
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+@receiver(post_save, sender=BlockedSlot)
+@receiver(post_delete, sender=BlockedSlot)
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=BlockRule)
+@receiver(post_delete, sender=BlockRule)
+@receiver(post_save, sender=BlockRuleException)
+@receiver(post_delete, sender=BlockRuleException)
+@receiver(post_save, sender=BusinessHours)
+@receiver(post_delete, sender=BusinessHours)
+@receiver(post_save, sender=Resource)
+@receiver(post_delete, sender=Resource)
+@receiver(m2m_changed, sender=Resource.services.through)
+def _schedule_changed(sender, **kwargs):
+    bump_on_commit()
+
+
+# ---------- Registro de cambios (sincronización incremental) ----------
+
+_CHANGE_KINDS = {Appointment: ScheduleChange.APPOINTMENT, BlockedSlot: ScheduleChange.BLOCK}
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+@receiver(post_save, sender=BlockedSlot)
+@receiver(post_delete, sender=BlockedSlot)
+def _log_event_change(sender, instance, **kwargs):
+    publish_on_commit(record_change(_CHANGE_KINDS[sender], instance.pk))
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=BlockRule)
+@receiver(post_delete, sender=BlockRule)
+@receiver(post_save, sender=BlockRuleException)
+@receiver(post_delete, sender=BlockRuleException)
+@receiver(post_save, sender=Resource)
+@receiver(post_delete, sender=Resource)
+def _log_reset(sender, **kwargs):
+    # Cambia el título/color de muchos eventos o los bloqueos de fondo
+    publish_on_commit(record_change(ScheduleChange.RESET))
@@ -0,0 +1,66 @@
+# salon/citas/snapshots.py
+"""
+Objetos armados una vez por proceso (reglas, horarios, catálogo...) que se
+reconstruyen solo cuando cambia su versión en la caché compartida.
+
+Cada request cuesta una lectura de caché (la versión); la base de datos solo
+se consulta al reconstruir. Las señales llaman a invalidate() y así todos los
+workers de gunicorn se enteran del cambio.
+
+La versión nueva se publica después del commit: si cambiara antes, otro
+worker podría reconstruir en ese momento (sin ver el cambio todavía) y
+guardar los datos viejos bajo la versión nueva, sin vencimiento.
+"""
+import threading
+import uuid
+import weakref
+
+from django.core.cache import cache
+from django.db import transaction
+
+_instances = weakref.WeakSet()
+
+
+def reset_snapshots():
+    """
+    Olvida lo armado en este proceso (todos los snapshots). Para los
+    benchmarks, que cambian de base de datos y de caché a mitad de proceso.
+    """
+    for snapshot in list(_instances):
+        snapshot._value = None
+        snapshot._version = None
+
+
+class ProcessSnapshot:
+    def __init__(self, name, builder):
+        _instances.add(self)
+        self.key = f"citas:snapshot:{name}"
+        self._builder = builder
+        self._lock = threading.Lock()
+        self._version = None
+        self._value = None
+
+    def version(self):
+        """Versión vigente (si la caché la perdió, se crea una nueva)."""
+        version = cache.get(self.key)
+        if version is None:
+            cache.add(self.key, uuid.uuid4().hex, timeout=None)
+            version = cache.get(self.key)
+        return version
+
+    def get(self):
+        version = self.version()
+        if self._value is None or version != self._version:
+            with self._lock:
+                if self._value is None or version != self._version:
+                    self._value = self._builder()
+                    self._version = version
+        return self._value
+
+    def invalidate(self):
+        """Versión nueva al confirmarse la transacción en curso (o ya, sin transacción)."""
+        transaction.on_commit(self._bump)
+
+    def _bump(self):
+        cache.set(self.key, uuid.uuid4().hex, timeout=None)
+        self._value = None
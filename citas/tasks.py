@@ -0,0 +1,32 @@
+# salon/citas/tasks.py
+"""
+Tareas del worker (citas/jobs.py). Se encolan desde las señales y las vistas;
+reciben ids y nombres de campo, y releen el objeto al correr (puede haber
+cambiado o haberse borrado mientras esperaba).
+"""
+from django.apps import apps
+
+from .images import delete_variants, refresh_variants
+from .jobs import task
+from .models import Appointment
+from .whatsapp import send_booking_notifications
+
+
+@task("images.refresh", concurrency=2)
+def refresh_image_variants(model, pk, image_field, variants_field):
+    instance = apps.get_model(model).objects.filter(pk=pk).first()
+    if instance is not None:
+        refresh_variants(instance, image_field, variants_field)
+
+
+@task("images.delete", uses_cache=False)
+def delete_image_variants(model, image_field, data):
+    storage = apps.get_model(model)._meta.get_field(image_field).storage
+    delete_variants(data, storage)
+
+
+@task("whatsapp.booking", uses_cache=False)
+def booking_notifications(appointment_id):
+    appointment = Appointment.objects.select_related("service").filter(pk=appointment_id).first()
+    if appointment is not None:
+        send_booking_notifications(appointment)
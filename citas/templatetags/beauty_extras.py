@@ -7,6 +7,9 @@ Created on Tue Nov 25 17:16:39 2025
 
 # citas/templatetags/beauty_extras.py
 from django import template
+from django.utils.html import format_html
+
+from ..images import responsive_image
 
 register = template.Library()
 
@@ -27,3 +30,36 @@ def price_dots(value):
     formatted = f"{value_int:,}"
     # Reemplazamos coma por punto: "15.000"
     return formatted.replace(",", ".")
+
+
+@register.simple_tag
+def responsive(field, variants):
+    """
+    ResponsiveImage (citas/images.py) de una foto y su JSONField de versiones,
+    para usar con {% picture %}:
+        {% responsive p.before_image p.before_variants as img %}
+    """
+    return responsive_image(field, variants)
+
+
+@register.simple_tag
+def picture(image, alt="", css_class="", sizes="100vw", loading="lazy"):
+    """
+    <picture> con srcset WebP y JPEG de respaldo. `sizes` es el ancho que
+    ocupa la foto en pantalla, para que el navegador elija la versión.
+    Sin versiones todavía, un <img> con el original.
+    """
+    if image is None:
+        return ""
+    dimensions = format_html(' width="{}" height="{}"', image.width, image.height) if image.width else ""
+    if not image.srcset_jpeg:
+        return format_html(
+            '<img src="{}" class="{}" alt="{}" loading="{}"{}>',
+            image.url, css_class, alt, loading, dimensions,
+        )
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" class="{}" alt="{}" loading="{}" decoding="async"{}></picture>',
+        image.srcset_webp, sizes,
+        image.url, image.srcset_jpeg, sizes, css_class, alt, loading, dimensions,
+    )
@@ -0,0 +1,73 @@
+# salon/citas/testimonials.py
+"""
+Testimonios por páginas con cursor (keyset), más nuevos primero.
+
+El cursor es "<created_at ISO>,<id>" del último testimonio entregado; la
+página siguiente pide los que van estrictamente después en el orden
+(created_at DESC, id DESC). Con el índice testimonial_feed
+(-created_at, -id, solo activos) cada página cuesta lo mismo sin importar cuántos
+testimonios haya (un OFFSET, en cambio, recorre todo lo anterior), y las
+fotos se traen solo para los de la página.
+"""
+from django.db.models import Q, prefetch_related_objects
+from django.utils.dateparse import parse_datetime
+
+from .images import responsive_image
+from .models import Testimonial
+
+PAGE_SIZE = 12
+MAX_PAGE_SIZE = 50
+
+
+def encode_cursor(testimonial):
+    return f"{testimonial.created_at.isoformat()},{testimonial.pk}"
+
+
+def decode_cursor(value):
+    """(created_at, id) del cursor; ValueError si no es válido."""
+    stamp, _, pk = value.rpartition(",")
+    created_at = parse_datetime(stamp)
+    if created_at is None:
+        raise ValueError(value)
+    return created_at, int(pk)
+
+
+def testimonial_page(before=None, limit=PAGE_SIZE):
+    """
+    (testimonios, cursor de la página siguiente o None). `before` es un
+    cursor ya decodificado. Dos consultas: testimonios y sus fotos.
+    """
+    qs = Testimonial.objects.filter(active=True)
+    if before is not None:
+        created_at, pk = before
+        # El created_at <= ... separado le da al índice un rango donde empezar
+        qs = qs.filter(created_at__lte=created_at).filter(Q(created_at__lt=created_at) | Q(pk__lt=pk))
+    # Uno de más para saber si hay otra página; las fotos, solo de la página
+    items = list(qs.order_by("-created_at", "-pk")[: limit + 1])
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1])
+    prefetch_related_objects(items, "photos")
+    return items, next_cursor
+
+
+def _image_json(image):
+    # Los mismos datos que usa {% picture %}; None si no hay foto
+    return image._asdict() if image else None
+
+
+def testimonial_json(testimonial):
+    return {
+        "id": testimonial.pk,
+        "name": testimonial.name,
+        "comment": testimonial.comment,
+        "photos": [
+            {
+                "before": _image_json(responsive_image(photo.before_image, photo.before_variants)),
+                "after": _image_json(responsive_image(photo.after_image, photo.after_variants)),
+                "caption": photo.caption,
+            }
+            for photo in testimonial.photos.all()
+        ],
+    }
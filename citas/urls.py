@@ -5,9 +5,15 @@ urlpatterns = [
     path('',views.home, name="home"), 
     path('reservar/', views.reservar_cita, name='reservar_cita'),
     path('agenda/', views.calendar_view, name='calendar_view'),
+    path('agenda/<str:token>.ics', views.agenda_ics, name='agenda_ics'),
     path('api/appointments/', views.appointments_json, name='appointments_json'),
+    path('api/appointments/changes/', views.appointment_changes_json, name='appointment_changes_json'),
+    path('api/appointments/stream/', views.appointments_stream, name='appointments_stream'),
     path('api/available-times/', views.available_times_json, name='available_times_json'),  # ← NUEVO
+    path('api/next-available/', views.next_available_json, name='next_available_json'),
+    path('api/testimonios/', views.testimonials_json, name='testimonials_json'),
     path('listar/', views.appointments_list, name='appointments_list'),
     path('servicios/', views.servicios, name='servicios'),
     path('testimonios/', views.testimonios, name='testimonios'),
+    path('secciones/<slug:name>/', views.home_section, name='home_section'),
 ]
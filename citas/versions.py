@@ -0,0 +1,81 @@
+# salon/citas/versions.py
+"""
+Versión de la agenda para ETag / Last-Modified en las APIs JSON.
+
+Un contador que solo sube (ScheduleVersion, una fila) más la hora del último
+cambio. Las señales lo suben después del commit de cada cambio en citas,
+bloqueos, servicios, horarios o recursos. Leerlo cuesta una lectura de
+caché; la base de datos solo se consulta si la caché no lo tiene.
+
+La copia en caché no vence: cada subida la reescribe desde la fila (nunca
+se queda con una copia vieja), y si la caché la pierde se vuelve a leer
+de la fila. Una lectura que trae la fila vieja justo durante una subida
+solo la guarda si no hay nada (cache.add), así que no pisa la nueva.
+
+Con @schedule_conditional, un If-None-Match / If-Modified-Since que coincide
+se contesta 304 antes de que la vista haga una sola consulta.
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from .hours import SLOT_MINUTES
+from .models import ScheduleVersion
+
+CACHE_KEY = "citas:schedule:version"
+
+
+def _read_row():
+    row, _ = ScheduleVersion.objects.get_or_create(pk=1)
+    return (row.counter, row.updated_at)
+
+
+def schedule_version():
+    """(contador, hora del último cambio) vigentes."""
+    value = cache.get(CACHE_KEY)
+    if value is None:
+        value = _read_row()
+        if not cache.add(CACHE_KEY, value, timeout=None):
+            value = cache.get(CACHE_KEY) or value
+    return value
+
+
+def bump_schedule_version():
+    """Sube el contador en la base de datos y copia la fila a la caché."""
+    now = timezone.now()
+    if not ScheduleVersion.objects.filter(pk=1).update(counter=F("counter") + 1, updated_at=now):
+        ScheduleVersion.objects.get_or_create(pk=1, defaults={"counter": 1, "updated_at": now})
+    # Dos subidas a la vez pueden escribir en la caché en otro orden que en
+    # la base: se reescribe hasta que la copia coincide con la fila
+    while True:
+        value = _read_row()
+        cache.set(CACHE_KEY, value, timeout=None)
+        if _read_row() == value:
+            return
+
+
+def bump_on_commit():
+    """Para las señales: sube la versión cuando el cambio ya es visible."""
+    transaction.on_commit(bump_schedule_version)
+
+
+def _cached_version(request):
+    # condition() pide ETag y Last-Modified por separado: una lectura por request
+    if not hasattr(request, "_schedule_version"):
+        request._schedule_version = schedule_version()
+    return request._schedule_version
+
+
+def _etag(request, *args, **kwargs):
+    counter, _ = _cached_version(request)
+    # El paso de horas cambia las respuestas sin tocar la base de datos
+    return f"schedule-{counter}-{SLOT_MINUTES}"
+
+
+def _last_modified(request, *args, **kwargs):
+    return _cached_version(request)[1]
+
+
+schedule_conditional = condition(etag_func=_etag, last_modified_func=_last_modified)
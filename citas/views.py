@@ -6,110 +6,85 @@ Created on Tue Oct 28 21:31:45 2025
 """
 
 # salon/citas/views.py
-from datetime import time as dtime, datetime, timedelta
+from datetime import date, datetime, timedelta
+from functools import wraps
 
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
 from .forms import AppointmentForm
 from .models import (
-    ServiceCategory,
     Service,
     Appointment,
-    BlockedSlot,
     Testimonial,
     BeforeAfter,
-    HomeBackground,
     VipCode,
-    Package,
 )
-from .whatsapp import send_booking_notifications  # WhatsApp notificaciones
+from .availability import (  # motor de disponibilidad (con caché)
+    format_minutes,
+    get_schedule,
+    get_schedules,
+    next_available,
+)
+from .booking import book_appointment  # reservas con candado por día
+from .catalog import catalog  # servicios, paquetes y fondo (snapshot)
+from . import fragments  # secciones de home.html cacheadas
+from .pagecache import anonymous_page_cache  # página completa para anónimos
+from .testimonials import (  # testimonios por cursor
+    PAGE_SIZE as TESTIMONIALS_PAGE_SIZE,
+    MAX_PAGE_SIZE as TESTIMONIALS_MAX_PAGE_SIZE,
+    decode_cursor,
+    testimonial_json,
+    testimonial_page,
+)
+from .feed import calendar_events, stream_json_array  # eventos del calendario
+from .changes import changes_since, current_token  # sincronización incremental
+from . import ics  # agenda .ics para el celular
+from .live import sse_stream  # avisos en vivo al calendario del admin
+from .versions import schedule_conditional  # ETag / 304 por versión de la agenda
+from .jobs import enqueue  # WhatsApp y trabajos lentos, fuera del request
 
-# 🕘 Configuración de horario laboral
-OPEN_HOUR = 8
-CLOSE_HOUR = 20
-BUSINESS_HOURS = range(OPEN_HOUR, CLOSE_HOUR + 1)  # 08..20
 
+# Máximo de días por consulta de rango en /api/available-times/
+MAX_RANGE_DAYS = 62
 
-# ---------- Utilidades ----------
+# /api/appointments/: días como máximo por ventana (el mes de FullCalendar
+# son 42); una ventana más larga se recorta
+MAX_CALENDAR_DAYS = 62
 
-def _all_times():
-    """['08:00','09:00',...,'20:00'] (horas en punto)."""
-    return [dtime(hour=h).strftime("%H:%M") for h in BUSINESS_HOURS]
+# /api/next-available/: máximo de resultados y días hacia adelante
+NEXT_AVAILABLE_MAX_LIMIT = 20
+NEXT_AVAILABLE_HORIZON_DAYS = 120
 
+# /secciones/<nombre>/: segundos que el navegador puede reusar una sección
+# de la home sin volver a preguntar (después revalida con ETag)
+HOME_SECTION_MAX_AGE = 5 * 60
 
-def _time_in_range(t, start, end):
-    """True si t está en [start, end) (fin abierto)."""
-    return (start is not None and end is not None and start <= t < end)
 
+# ---------- Utilidades ----------
 
-def _available_times_for_date(date_str, service_duration=None):
+def _available_times_for_date(date_str, service_duration=None, service_id=None):
     """
     Devuelve SOLO horas libres (strings 'HH:MM') para una fecha YYYY-MM-DD,
     excluyendo:
       - Citas existentes (considerando su duración)
       - Bloqueos por día completo, rango y puntuales
       - Y, si viene service_duration, horas que no caben antes del cierre.
+      - Con estilistas / sillas, horas sin ninguno libre que haga service_id.
+    El cálculo lo hace el motor de citas/availability.py.
     """
-    all_slots = _all_times()
     if not date_str:
         return []
 
-    # 👇 Convertimos primero a objeto date
     date_obj = datetime.fromisoformat(date_str).date()
-
-    # 🔒 Domingo cerrado (regla dura)
-    # weekday(): 0=lunes, ..., 6=domingo
-    if date_obj.weekday() == 6:
-        return []
-
-    # Citas -> rangos ocupados
-    appts = Appointment.objects.select_related("service").filter(date=date_str)
-    busy_ranges = []
-    for ap in appts:
-        dur = getattr(ap.service, "duration_minutes", 60) if getattr(ap, "service", None) else 60
-        start_dt = datetime.combine(ap.date, ap.time)
-        end_dt = start_dt + timedelta(minutes=dur)
-        busy_ranges.append((start_dt.time(), end_dt.time()))
-
-    # Bloqueos
-    blocked_qs = BlockedSlot.objects.filter(date=date_str)
-    # Día completo
-    if any(not b.start_time and not b.end_time and not b.time for b in blocked_qs):
-        return []
-
-    blocked_exact = {b.time.strftime("%H:%M") for b in blocked_qs if b.time}
-    blocked_ranges = [(b.start_time, b.end_time) for b in blocked_qs if b.start_time and b.end_time]
-
-    free = []
-    close_t = dtime(CLOSE_HOUR, 0)
-
-    for s in all_slots:
-        if s in blocked_exact:
-            continue
-
-        hh, mm = map(int, s.split(":"))
-        t_obj = dtime(hh, mm)
-
-        # Dentro de bloqueos por rango
-        if any(_time_in_range(t_obj, st, et) for (st, et) in blocked_ranges):
-            continue
-
-        # Dentro de rangos ocupados por citas existentes (duración real)
-        if any(_time_in_range(t_obj, st, et) for (st, et) in busy_ranges):
-            continue
-
-        # Debe caber antes del cierre si sabemos la duración del servicio elegido
-        if service_duration:
-            start_dt = datetime.combine(date_obj, t_obj)
-            end_dt = start_dt + timedelta(minutes=service_duration)
-            if end_dt > datetime.combine(date_obj, close_t):
-                continue
-
-        free.append(s)
-
-    return free
+    return get_schedule(date_obj).free_times(service_duration, service_id=service_id)
 
 
 # ---------- Vistas independientes (reservas, calendario, JSON, servicios, testimonios) ----------
@@ -118,30 +93,20 @@ def reservar_cita(request):
     """
     Vista independiente solo para reservas (URL /reservar/).
     Renderiza el formulario y guarda si es válido.
-    Tras guardar, envía WhatsApp a propietaria y cliente.
+    Tras guardar, encola el WhatsApp a propietaria y cliente (run_jobs).
     """
     success = None
+    ap = None
 
-    selected_date = request.POST.get("date") if request.method == "POST" else None
-    selected_service_id = request.POST.get("service") if request.method == "POST" else None
-    service_duration = None
-
-    if selected_service_id:
-        svc = Service.objects.filter(id=selected_service_id).only("duration_minutes").first()
-        if svc:
-            service_duration = getattr(svc, "duration_minutes", 60)
-
-    available_times = _available_times_for_date(selected_date, service_duration) if selected_date else None
-
-    form = AppointmentForm(request.POST or None, available_times=available_times)
+    if request.method == "POST":
+        # Valida y guarda con el día bloqueado (una sola lectura de la agenda)
+        form, ap = book_appointment(request.POST)
+    else:
+        form = AppointmentForm()
 
-    if request.method == "POST" and form.is_valid():
-        ap = form.save()
+    if ap is not None:
         success = "¡Cita reservada con éxito!"
-        try:
-            send_booking_notifications(ap)
-        except Exception as e:
-            print("WHATSAPP send error:", e)
+        enqueue("whatsapp.booking", appointment_id=ap.pk)
         form = AppointmentForm(available_times=None)
 
     return render(
@@ -158,104 +123,300 @@ def calendar_view(request):
     return render(request, "citas/calendar.html")
 
 
+def _calendar_window(request):
+    """
+    (primer_día, último_día) a partir de ?start=...&end=... de FullCalendar
+    (fechas ISO, con o sin hora; `end` es exclusivo). None si no vienen.
+    """
+    try:
+        start = date.fromisoformat(request.GET["start"][:10])
+        end = date.fromisoformat(request.GET["end"][:10]) - timedelta(days=1)
+    except (KeyError, ValueError):
+        return None
+    return (start, end) if start <= end else None
+
+
+@cache_control(no_cache=True)
+@schedule_conditional
 def appointments_json(request):
-    events = []
-
-    # Citas
-    for ap in Appointment.objects.select_related("service").all():
-        duration_min = getattr(ap.service, "duration_minutes", 60) if getattr(ap, "service", None) else 60
-        color = getattr(ap.service, "color", "#0d6efd") if getattr(ap, "service", None) else "#0d6efd"
-        start_dt = datetime.combine(ap.date, ap.time)
-        end_dt = start_dt + timedelta(minutes=duration_min)
-        events.append({
-            "title": f"{ap.customer_name} - {ap.service.name if getattr(ap, 'service', None) else ''}",
-            "start": start_dt.isoformat(),
-            "end": end_dt.isoformat(),
-            "color": color,
-        })
-
-    # Bloqueos como fondo
-    for b in BlockedSlot.objects.all():
-        if b.start_time and b.end_time:
-            start_dt = datetime.combine(b.date, b.start_time)
-            end_dt = datetime.combine(b.date, b.end_time)
-        elif b.time:
-            start_dt = datetime.combine(b.date, b.time)
-            end_dt = start_dt + timedelta(minutes=60)
-        else:
-            start_dt = datetime.combine(b.date, dtime(0, 0))
-            end_dt = datetime.combine(b.date, dtime(23, 59))
+    """
+    GET /api/appointments/?start=...&end=... (los manda FullCalendar al cambiar
+    de vista). Solo citas y bloqueos de esa ventana, filtrados por fecha con
+    índice; una ventana de más de MAX_CALENDAR_DAYS días se recorta.
+    ETag = versión de la agenda: si no cambió nada, 304 sin consultar la base.
+    """
+    window = _calendar_window(request)
+    if window is None:
+        return JsonResponse({"error": "Faltan start y end (YYYY-MM-DD)."}, status=400)
+    start, end = window
+    end = min(end, start + timedelta(days=MAX_CALENDAR_DAYS - 1))
+
+    # Se arma y se envía por tandas: memoria acotada aunque la ventana tenga
+    # miles de citas (ver citas/feed.py)
+    return StreamingHttpResponse(
+        stream_json_array(calendar_events(start, end)),
+        content_type="application/json",
+    )
+
+
+def _valid_feed_token(token):
+    expected = getattr(settings, "CALENDAR_FEED_TOKEN", "")
+    return bool(expected) and constant_time_compare(token, expected)
+
+
+def _ics_etag(request, token):
+    # Sin token válido no hay ETag: la vista contesta 404
+    return ics.feed_etag() if _valid_feed_token(token) else None
+
+
+@condition(etag_func=_ics_etag)
+def agenda_ics(request, token):
+    """
+    GET /agenda/<token>.ics -> agenda (citas y bloqueos) para suscribirse
+    desde la app de calendario. Ventana móvil de ics.DAYS_BACK días atrás a
+    ics.DAYS_AHEAD adelante; cacheado por versión de la agenda.
+    """
+    if not _valid_feed_token(token):
+        raise Http404
+    body = ics.cached_feed()
+    if body is not None:
+        return HttpResponse(body, content_type=ics.CONTENT_TYPE)
+    return StreamingHttpResponse(ics.streamed_feed(), content_type=ics.CONTENT_TYPE)
+
+
+def _staff_only(view):
+    """Las APIs con nombres y teléfonos de clientas: solo personal del salón."""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if not (request.user.is_active and request.user.is_staff):
+            return JsonResponse({"error": "Solo para el personal del salón."}, status=403)
+        return view(request, *args, **kwargs)
+
+    return wrapped
+
+
+def _changes_etag(request):
+    # El último token entregable, no la versión de la agenda: la versión sube
+    # antes de que el cambio tenga su seq, y un 304 con ese ETag lo perdería
+    return f"changes-{current_token()}"
+
+
+@cache_control(no_cache=True)
+@_staff_only
+@condition(etag_func=_changes_etag)
+def appointment_changes_json(request):
+    """
+    GET /api/appointments/changes/?since=<token> (solo staff, como el stream)
+    -> {"token": "...", "reset": false, "upserted": [eventos], "deleted": ["appointment-12", ...]}
+    Solo lo que cambió después del token (eventos con el mismo formato que
+    /api/appointments/). Sin token, o con "reset": true, el cliente recarga el
+    feed completo y sigue desde el token nuevo. ETag = último token.
+    """
+    since = request.GET.get("since")
+    if since:
+        try:
+            since = int(since)
+        except ValueError:
+            return JsonResponse({"error": "Token inválido."}, status=400)
+        if since < 0:
+            return JsonResponse({"error": "Token inválido."}, status=400)
+    else:
+        since = None
+    return JsonResponse(changes_since(since))
+
+
+def _since_token(value):
+    """Token de sincronización como entero (None si falta o no es válido)."""
+    try:
+        since = int(value)
+    except (TypeError, ValueError):
+        return None
+    return since if since >= 0 else None
 
-        events.append({
-            "title": f"Bloqueo{f' - {b.reason}' if getattr(b, 'reason', '') else ''}",
-            "start": start_dt.isoformat(),
-            "end": end_dt.isoformat(),
-            "display": "background",
-            "color": "#adb5bd",
-        })
 
-    return JsonResponse(events, safe=False)
+async def appointments_stream(request):
+    """
+    GET /api/appointments/stream/?since=<token> (text/event-stream, solo staff)
+    Cada mensaje tiene el formato de /api/appointments/changes/. Primero llega
+    lo que cambió después del token y luego cada cambio apenas se confirma.
+    Al reconectar, EventSource manda Last-Event-ID y se sigue desde ahí.
+
+    Sin ASGI (runserver / gunicorn síncrono) responde 204: una conexión
+    abierta ocuparía un worker entero; el calendario sigue consultando
+    /api/appointments/changes/ cada tanto.
+    """
+    is_staff = await sync_to_async(lambda: request.user.is_active and request.user.is_staff)()
+    if not is_staff:
+        return JsonResponse({"error": "Solo para el personal del salón."}, status=403)
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
 
+    since = _since_token(request.headers.get("Last-Event-ID") or request.GET.get("since"))
+    response = StreamingHttpResponse(sse_stream(since), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # que nginx no junte los mensajes
+    return response
 
+
+@cache_control(no_cache=True)
+@schedule_conditional
 def available_times_json(request):
     """
     GET /api/available-times/?date=YYYY-MM-DD&service=<id>
     -> {"times": ["09:00", "10:00", ...]}
+
+    GET /api/available-times/?from=YYYY-MM-DD&to=YYYY-MM-DD&service=<id>
+    -> {"days": [{"date": "YYYY-MM-DD", "available": true, "times": [...]}, ...]}
+    (rango de hasta MAX_RANGE_DAYS días, p. ej. un mes completo del selector)
+
     Considera duración del servicio seleccionado para no ofrecer horas que no caben antes del cierre.
+    ETag = versión de la agenda: si no cambió nada, 304 sin consultar la base.
     """
     date_str = request.GET.get("date")
+    from_str = request.GET.get("from")
+    to_str = request.GET.get("to")
     service_id = request.GET.get("service")
     service_duration = None
+    service_pk = None
 
     if service_id:
         svc = Service.objects.filter(id=service_id).only("duration_minutes").first()
         if svc:
             service_duration = getattr(svc, "duration_minutes", 60)
+            service_pk = svc.pk
+
+    if from_str or to_str:
+        try:
+            start = date.fromisoformat(from_str or to_str)
+            end = date.fromisoformat(to_str or from_str)
+        except ValueError:
+            return JsonResponse({"error": "Fecha inválida (usar YYYY-MM-DD)."}, status=400)
+        if end < start or (end - start).days >= MAX_RANGE_DAYS:
+            return JsonResponse(
+                {"error": f"El rango debe ser de 1 a {MAX_RANGE_DAYS} días."},
+                status=400,
+            )
+
+        # Una consulta por tabla para los días que no estén en caché
+        days = []
+        for day, schedule in get_schedules(start, end).items():
+            times = schedule.free_times(service_duration, service_id=service_pk)
+            days.append({"date": day.isoformat(), "available": bool(times), "times": times})
+        return JsonResponse({"days": days})
 
-    times = _available_times_for_date(date_str, service_duration=service_duration) if date_str else []
+    times = (
+        _available_times_for_date(date_str, service_duration=service_duration, service_id=service_pk)
+        if date_str else []
+    )
     return JsonResponse({"times": times})
 
 
+def next_available_json(request):
+    """
+    GET /api/next-available/?service=<id>&after=YYYY-MM-DD&limit=N
+    -> {"results": [{"date": "YYYY-MM-DD", "time": "HH:MM"}, ...]}
+    Primeras N horas libres desde `after` (inclusive; por defecto hoy) para la
+    duración del servicio, buscando como máximo NEXT_AVAILABLE_HORIZON_DAYS días.
+    Fechas y horas ya pasadas no se ofrecen.
+    """
+    service_id = request.GET.get("service")
+    service_duration = None
+    service_pk = None
+
+    if service_id:
+        svc = Service.objects.filter(id=service_id).only("duration_minutes").first()
+        if not svc:
+            return JsonResponse({"error": "Servicio no encontrado."}, status=404)
+        service_duration = getattr(svc, "duration_minutes", 60)
+        service_pk = svc.pk
+
+    try:
+        after_str = request.GET.get("after")
+        after = date.fromisoformat(after_str) if after_str else timezone.localdate()
+        limit = int(request.GET.get("limit") or 1)
+    except ValueError:
+        return JsonResponse({"error": "Parámetros inválidos."}, status=400)
+    limit = max(1, min(limit, NEXT_AVAILABLE_MAX_LIMIT))
+
+    found = next_available(
+        after,
+        duration=service_duration,
+        limit=limit,
+        horizon_days=NEXT_AVAILABLE_HORIZON_DAYS,
+        service_id=service_pk,
+    )
+    return JsonResponse({
+        "results": [{"date": d.isoformat(), "time": format_minutes(m)} for d, m in found],
+    })
+
+
 def appointments_list(request):
     qs = Appointment.objects.select_related("service").order_by("date", "time")
     return render(request, "citas/appointments_list.html", {"appointments": qs})
 
 
+# Versión del contenido de cada página cacheada para visitas anónimas
+def _home_page_version():
+    # El <input type="date"> lleva la fecha de hoy como mínimo
+    return f"{catalog.version()}:{timezone.localdate().isoformat()}"
+
+
+def _testimonials_page_version():
+    return fragments.fragment_versions()["testimonials"]
+
+
+@anonymous_page_cache("servicios", catalog.version)
 def servicios(request):
     """
     Página independiente /servicios/ con servicios agrupados por categoría (hasta 3)
     y “Otros” para los servicios sin categoría.
     """
-    categorias = list(ServiceCategory.objects.order_by("name")[:3])
-    grupos = []
+    return render(request, "citas/servicios.html", {"grupos": catalog.get().service_groups(max_categories=3)})
+
+
+@anonymous_page_cache("testimonios", _testimonials_page_version)
+def testimonios(request):
+    """
+    Página /testimonios/: la primera página de testimonios; el resto llega
+    de /api/testimonios/ al hacer scroll.
+    """
+    items, next_cursor = testimonial_page()
+    return render(request, "citas/testimonios.html", {"items": items, "next_cursor": next_cursor})
 
-    for cat in categorias:
-        qs = Service.objects.filter(active=True, category=cat).order_by("name")
-        grupos.append((cat.name, qs))
 
-    sin_cat = Service.objects.filter(active=True, category__isnull=True).order_by("name")
-    if sin_cat.exists():
-        grupos.append(("Otros", sin_cat))
+def _testimonials_etag(request):
+    return f"testimonials-{_testimonials_page_version()}"
 
-    return render(request, "citas/servicios.html", {"grupos": grupos})
 
+@cache_control(no_cache=True)
+@condition(etag_func=_testimonials_etag)
+def testimonials_json(request):
+    """
+    GET /api/testimonios/?before=<created_at,id>&limit=N
+    -> {"results": [{"id", "name", "comment", "photos": [...]}], "next": "<cursor>" | null}
+    Más nuevos primero; `next` es el `before` de la página siguiente.
+    """
+    try:
+        before = request.GET.get("before")
+        before = decode_cursor(before) if before else None
+        limit = int(request.GET.get("limit") or TESTIMONIALS_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({"error": "Parámetros inválidos."}, status=400)
+    limit = max(1, min(limit, TESTIMONIALS_MAX_PAGE_SIZE))
 
-def testimonios(request):
-    items = (
-        Testimonial.objects.filter(active=True)
-        .prefetch_related("photos")
-        .order_by("-created_at")
-    )
-    return render(request, "citas/testimonios.html", {"items": items})
+    items, next_cursor = testimonial_page(before, limit)
+    return JsonResponse({"results": [testimonial_json(t) for t in items], "next": next_cursor})
 
 
 # ---------- HOME unificada (Reservar + Servicios + Testimonios + Paquetes + VIP) ----------
 
+@anonymous_page_cache("home", _home_page_version)
 def home(request):
     """
     Página principal con:
       - Bloque de 5 “botones” (Reservas, Servicios, Testimonios, Paquetes, Clientes VIP)
-      - Secciones ocultas que se muestran al hacer clic
+      - Secciones ocultas que se muestran al hacer clic (servicios, testimonios y
+        paquetes se cargan recién entonces, desde home_section)
       - Formulario de reservas (con WhatsApp)
       - Paquetes públicos y Paquetes VIP
       - Código VIP que muestra directamente la sección VIP al enviar.
@@ -265,7 +426,6 @@ def home(request):
 
     # --- Variables comunes ---
     success = None
-    available_times = None
 
     # Para VIP
     vip_client_name = None
@@ -281,19 +441,8 @@ def home(request):
                 vip = VipCode.objects.filter(code=code_str, active=True).first()
                 if vip:
                     vip_client_name = vip.name  # usamos este nombre en el template
-                    vip_packages = (
-                        Package.objects
-                        .filter(active=True, vip_only=True)
-                        .order_by("title")
-                    )
-                    # Formatear precios de paquetes VIP con miles separados por punto
-                    for pkg in vip_packages:
-                        if pkg.price is not None:
-                            try:
-                                value = int(pkg.price)
-                                pkg.formatted_price = f"{value:,}".replace(",", ".")
-                            except (TypeError, ValueError):
-                                pkg.formatted_price = ""
+                    # Paquetes VIP con precios ya formateados (catálogo en memoria)
+                    vip_packages = catalog.get().vip_packages
                 else:
                     vip_error = "Código VIP inválido o inactivo."
             else:
@@ -306,34 +455,13 @@ def home(request):
 
         else:
             # --------- Formulario de RESERVA ----------
-            selected_date = request.POST.get("date")
-            selected_service_id = request.POST.get("service")
-            service_duration = None
-
-            if selected_service_id:
-                svc = Service.objects.filter(
-                    id=selected_service_id
-                ).only("duration_minutes").first()
-                if svc:
-                    service_duration = getattr(svc, "duration_minutes", 60)
-
-            available_times = _available_times_for_date(
-                selected_date,
-                service_duration
-            ) if selected_date else None
-
-            form = AppointmentForm(
-                request.POST or None,
-                available_times=available_times
-            )
+            # Valida y guarda con el día bloqueado (una sola lectura de la agenda)
+            form, ap = book_appointment(request.POST)
 
-            if form.is_valid():
-                ap = form.save()
+            if ap is not None:
                 success = "¡Cita reservada con éxito!"
-                try:
-                    send_booking_notifications(ap)
-                except Exception as e:
-                    print("WHATSAPP send error:", e)
+                # Twilio tarda: los mensajes los manda el worker
+                enqueue("whatsapp.booking", appointment_id=ap.pk)
 
                 # Limpiamos el formulario tras guardar
                 form = AppointmentForm()
@@ -346,58 +474,9 @@ def home(request):
         # el dropdown de horas se llenará vía JS /api/available-times/
         form = AppointmentForm()
 
-    # --- Paquetes públicos (SIEMPRE definidos, GET o POST) ---
-    public_packages = Package.objects.filter(
-        active=True,
-        vip_only=False
-    ).order_by("title")
-
-    # Formateo de precios con miles separados por punto
-    for pkg in public_packages:
-        if pkg.price is not None:
-            try:
-                value = int(pkg.price)
-                pkg.formatted_price = f"{value:,}".replace(",", ".")
-            except (TypeError, ValueError):
-                pkg.formatted_price = ""
-
-    # --- Servicios agrupados por categoría (para la sección unificada) ---
-    service_groups = []
-
-    # Separamos categorías "normales" de las que se llaman "Otros"
-    all_cats = list(ServiceCategory.objects.all())
-    regular_cats = [c for c in all_cats if c.name.strip().lower() != "otros"]
-    otros_cats = [c for c in all_cats if c.name.strip().lower() == "otros"]
-
-    # 1) Categorías normales (orden alfabético)
-    for cat in sorted(regular_cats, key=lambda c: c.name):
-        qs = Service.objects.filter(active=True, category=cat).order_by("name")
-        if qs.exists():
-            service_groups.append((cat.name, qs))
-
-    # 2) Categorías llamadas "Otros" SIEMPRE después de las demás
-    for cat in sorted(otros_cats, key=lambda c: c.name):
-        qs = Service.objects.filter(active=True, category=cat).order_by("name")
-        if qs.exists():
-            service_groups.append((cat.name, qs))
-
-    # 3) Servicios sin categoría explícita (los ponemos al final bajo "Otros")
-    others_qs = Service.objects.filter(
-        active=True,
-        category__isnull=True
-    ).order_by("name")
-    if others_qs.exists():
-        service_groups.append(("Otros", others_qs))
-
-    # --- Testimonios para la vista unificada ---
-    testimonios = (
-        Testimonial.objects.filter(active=True)
-        .prefetch_related("photos")
-        .order_by("-created_at")[:12]
-    )
-
-    # --- Fondo configurable desde el admin ---
-    background = HomeBackground.objects.filter(active=True).first()
+    # Servicios, testimonios y paquetes no se arman acá: la página llega
+    # con la reserva y el menú, y cada sección se pide al abrirla
+    # (/secciones/<nombre>/, ver home_section)
 
     # Año actual para el footer
     now = timezone.now()
@@ -405,14 +484,57 @@ def home(request):
     return render(request, "citas/home.html", {
         "form": form,
         "success": success,
-        "available_times": available_times,
-        "service_groups": service_groups,   # 👈 usado en home.html
-        "testimonios": testimonios,
-        "background": background,
-        "public_packages": public_packages,
+        "background": catalog.get().background,
         "vip_packages": vip_packages,
         "vip_error": vip_error,
         "vip_client_name": vip_client_name,
         "initial_section": initial_section,
         "now": now,
+        # Versión de cada sección cacheada ({% cache %} en home.html y partials)
+        "fragments": fragments.fragment_versions(),
+        "fragment_timeout": fragments.TIMEOUT,
+    })
+
+
+# ---------- Secciones de la home (carga diferida) ----------
+
+def _home_testimonials():
+    # lazy: solo se consulta si la sección no está en la caché
+    return (
+        Testimonial.objects.filter(active=True)
+        .prefetch_related("photos")
+        .order_by("-created_at", "-pk")[:TESTIMONIALS_PAGE_SIZE]
+    )
+
+
+# nombre en la URL -> (sección cacheada en citas/fragments.py, contexto)
+HOME_SECTIONS = {
+    "servicios": ("services", lambda: {"service_groups": catalog.get().service_groups()}),
+    "testimonios": ("testimonials", lambda: {"testimonios": _home_testimonials()}),
+    "paquetes": ("packages", lambda: {"public_packages": catalog.get().public_packages}),
+}
+
+
+def _home_section_etag(request, name):
+    if name not in HOME_SECTIONS:
+        return None
+    request._fragment_versions = fragments.fragment_versions()
+    return f"{name}-{request._fragment_versions[HOME_SECTIONS[name][0]]}"
+
+
+@cache_control(public=True, max_age=HOME_SECTION_MAX_AGE)
+@condition(etag_func=_home_section_etag)
+def home_section(request, name):
+    """
+    GET /secciones/<servicios|testimonios|paquetes>/ -> HTML de esa sección
+    de la home (sin <html>), igual para todas las visitas. ETag = versión de
+    la sección: si no cambió, 304 sin renderizar nada.
+    """
+    if name not in HOME_SECTIONS:
+        raise Http404
+    _, context = HOME_SECTIONS[name]
+    return render(request, f"citas/partials/home_{name}.html", {
+        **context(),
+        "fragments": request._fragment_versions,
+        "fragment_timeout": fragments.TIMEOUT,
     })
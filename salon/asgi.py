@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+
+En producción se sirve con gunicorn + workers de uvicorn (ver Procfile): las
+conexiones SSE del calendario (/api/appointments/stream/) quedan abiertas sin
+ocupar un worker cada una.
 """
 
 import os
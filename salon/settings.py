@@ -88,9 +88,59 @@ else:
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": BASE_DIR / "db.sqlite3",
+            # Tests en archivo (no en memoria compartida): así las reservas
+            # concurrentes esperan el candado en vez de fallar con "locked".
+            "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
         }
     }
 
+# -----------------------------------------------
+# CACHÉ
+# -----------------------------------------------
+# Local / tests: memoria del proceso.
+# Producción con varios workers de gunicorn: definir REDIS_URL para que todos
+# compartan la misma caché (disponibilidad por día, contadores, etc.). Sin
+# ella, el worker de run_jobs solo corre las tareas que no tocan la caché
+# (WhatsApp, borrar archivos; ver citas/management/commands/run_jobs.py).
+# (redis está en requirements.txt)
+REDIS_URL = os.getenv("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "salon",
+        }
+    }
+
+# -----------------------------------------------
+# AGENDA (citas)
+# -----------------------------------------------
+# Cada cuántos minutos se pueden reservar citas: 15, 30 o 60 (en punto)
+APPOINTMENT_SLOT_MINUTES = int(os.getenv("APPOINTMENT_SLOT_MINUTES", 60))
+
+# Segundos que vive en caché la ocupación de un día (las señales la invalidan antes)
+AVAILABILITY_CACHE_TIMEOUT = int(os.getenv("AVAILABILITY_CACHE_TIMEOUT", 60 * 60 * 24))
+
+# Token secreto de la agenda en formato iCalendar (/agenda/<token>.ics) para
+# suscribirse desde el celular. Vacío = feed desactivado.
+CALENDAR_FEED_TOKEN = os.getenv("CALENDAR_FEED_TOKEN", "")
+
+# Avisos en vivo del calendario del admin (SSE, citas/live.py). El backend
+# local solo sirve con un worker; con REDIS_URL los avisos pasan por Redis y
+# llegan a las conexiones abiertas en cualquier worker.
+CALENDAR_LIVE_BACKEND = os.getenv(
+    "CALENDAR_LIVE_BACKEND",
+    "citas.live.RedisBroadcaster" if REDIS_URL else "citas.live.LocalBroadcaster",
+)
+
 # -----------------------------------------------
 # CONFIGURACIÓN DE TEMPLATES
 # -----------------------------------------------